@@ -1,167 +1,341 @@
-from flask import Flask, request, jsonify, session, render_template
+from flask import Flask, request, jsonify, session, render_template, Response, stream_with_context
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from werkzeug.security import generate_password_hash, check_password_hash
+from werkzeug.middleware.proxy_fix import ProxyFix
 import requests
 import json
 import os
-import re
-from deep_translator import GoogleTranslator
-from langdetect import detect, DetectorFactory
 from dotenv import load_dotenv
+load_dotenv()  # Before the local imports below, which read their settings from the environment
+import threading
+import logging
+import hashlib
 import time
-try:
-    from googletrans import Translator
-except ImportError:
-    Translator = None
-
-# Ensure consistent language detection with langdetect
-DetectorFactory.seed = 0
-
-# Initialize Translator (default to translating to English for processing)
-translator_to_en = GoogleTranslator(source='auto', target='en')
+from storage import HistoryStore, SessionExistsError
+from ratelimit import RATELIMIT_STORAGE_URI, user_or_remote_address
+from auth import Authenticator, HasherBusyError, PasswordHasher, UserExistsError, UserStore
+from translation_cache import TranslationCache
+from batch_translation import batch_translate, split_line_prefix
+from clients import HTTP_TIMEOUT, http_session, get_translator, get_googletrans
+from therapy_filter import is_therapy_related
+from formatting import ResponseFormatter, format_api_response
+from langid import LanguageIdentifier
+from context_builder import ContextBuilder
+from response_cache import RESPONSE_CACHE_ENABLED, ResponseCache, SingleFlight, normalize_prompt
+from retries import sleep_backoff
+from tracing import init_tracing, stage
+from metrics import (GOOGLETRANS_FALLBACKS, RESPONSE_CACHE_REQUESTS, RESPONSE_CACHE_SAVED_SECONDS, RETRIES,
+                     UPSTREAM_RESPONSES, GaugeCallback, render_metrics)
 
 app = Flask(__name__)
-load_dotenv()
+init_tracing(app)
 app.secret_key = os.getenv("FLASK_SECRET_KEY")
 XAI_API_KEY = os.getenv("XAI_API_KEY")
+# RATELIMIT_ENABLED=0 turns flask-limiter off, e.g. for load tests
+app.config["RATELIMIT_ENABLED"] = os.getenv("RATELIMIT_ENABLED", "1") == "1"
+
+# Number of reverse proxies in front of the app whose X-Forwarded-For can be trusted
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", 0))
+if TRUSTED_PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_HOPS, x_proto=TRUSTED_PROXY_HOPS)
 
-limiter = Limiter(get_remote_address, app=app, default_limits=["800 per day", "10 per minute"])
+DEFAULT_RATE_LIMITS = os.getenv("DEFAULT_RATE_LIMITS", "800 per day;10 per minute")
+CHAT_RATE_LIMIT = os.getenv("CHAT_RATE_LIMIT", "50 per day")
+SIGNUP_RATE_LIMIT = os.getenv("SIGNUP_RATE_LIMIT", "5 per minute")
+LOGIN_RATE_LIMIT = os.getenv("LOGIN_RATE_LIMIT", "10 per minute")
+SESSION_RATE_LIMIT = os.getenv("SESSION_RATE_LIMIT", "10 per minute")
+
+# Counters live in RATELIMIT_STORAGE_URI so every worker enforces the same limits
+limiter = Limiter(get_remote_address, app=app, default_limits=[DEFAULT_RATE_LIMITS],
+                  storage_uri=RATELIMIT_STORAGE_URI)
 
 USERS_FILE = "users.json"
+USERS_DB = os.getenv("USERS_DB", "users.db")
 HISTORY_FILE = "history.json"
-
-for file in [USERS_FILE, HISTORY_FILE]:
-    if not os.path.exists(file):
-        with open(file, "w") as f:
-            json.dump({}, f)
+HISTORY_DB = os.getenv("HISTORY_DB", "history.db")
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", 50))
+MAX_HISTORY_PAGE_SIZE = 200
+TRANSLATION_CACHE_DB = os.getenv("TRANSLATION_CACHE_DB", "translations.db")
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", 10000))
+# Reply lines up to this length (step headings, stock phrases) are cached; longer ones
+# are specific to one conversation and never stored
+TRANSLATION_CACHE_MAX_CHARS = int(os.getenv("TRANSLATION_CACHE_MAX_CHARS", 80))
+
+user_store = UserStore(USERS_DB)
+# One-shot import of the legacy users.json on first start; the import re-checks
+# emptiness under the write lock, so only one of several starting workers runs it
+if user_store.is_empty() and os.path.exists(USERS_FILE):
+    user_store.migrate_from_json(USERS_FILE)
+password_hasher = PasswordHasher()
+authenticator = Authenticator(user_store, password_hasher)
+GaugeCallback("therapi_password_hash_queue", "Password hashes waiting for a hashing worker.", password_hasher.pending)
+
+history_store = HistoryStore(HISTORY_DB)
+# One-shot import of the legacy whole-file history on first start (same re-check)
+if history_store.is_empty() and os.path.exists(HISTORY_FILE):
+    history_store.migrate_from_json(HISTORY_FILE)
+# Chat turns are committed inline by default, so the next read sees them whichever
+# worker serves it. HISTORY_WRITE_BEHIND=1 queues them for a background thread that
+# commits in batches; reads only wait for this process's queue, so use it with a
+# single worker. The queue is drained at exit.
+if os.getenv("HISTORY_WRITE_BEHIND", "0") == "1":
+    history_writer = history_store.start_writer()
+    GaugeCallback("therapi_history_queue_depth", "Chat turns waiting for the history writer.", history_writer.depth)
+    GaugeCallback("therapi_history_batches_total", "Group commits made by the history writer.", lambda: history_writer.batches, "counter")
+    GaugeCallback("therapi_history_inline_writes_total", "Chat turns written inline because the queue stayed full.", lambda: history_writer.inline_writes, "counter")
+
+# Earlier turns sent to xAI with each message, bounded by CONTEXT_TOKEN_BUDGET
+context_builder = ContextBuilder(history_store)
+
+# Profiles are loaded once; detection is deterministic and never sleeps
+language_identifier = LanguageIdentifier()
+
+translation_cache = TranslationCache(TRANSLATION_CACHE_DB, max_entries=TRANSLATION_CACHE_SIZE)
+GaugeCallback("therapi_translation_cache_hits_total", "Translation cache hits (memory and disk).", lambda: translation_cache.hits, "counter")
+GaugeCallback("therapi_translation_cache_disk_hits_total", "Translation cache hits served from disk.", lambda: translation_cache.disk_hits, "counter")
+GaugeCallback("therapi_translation_cache_misses_total", "Translation cache misses.", lambda: translation_cache.misses, "counter")
+GaugeCallback("therapi_translation_cache_evictions_total", "Translation cache LRU evictions.", lambda: translation_cache.evictions, "counter")
 
 # Language code mapping for deep-translator compatibility
 LANGUAGE_CODE_MAP = {
     'zh': 'zh-CN',  # Map 'zh' to 'zh-CN' (Simplified Chinese)
+    'zh-cn': 'zh-CN',
     'zh-Hant': 'zh-TW',  # Traditional Chinese
+    'zh-tw': 'zh-TW',
     'de': 'de',  # German
     'fr': 'fr',  # French
     # Add more mappings as needed
 }
 
-def load_json(file):
-    try:
-        with open(file, "r") as f:
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError) as e:
-        app.logger.error(f"Error loading {file}: {str(e)}")
-        return {}
+SYSTEM_PROMPT = (
+    "You are a professional therapy doctor specializing in mental health. "
+    "Only answer questions related to therapy, mental health, emotional wellbeing, and related topics. "
+    "If a question is not related to therapy, politely decline to answer and ask the user to ask a therapy-related question."
+)
 
-def save_json(file, data):
-    try:
-        with open(file, "w") as f:
-            json.dump(data, f, indent=4)
-        app.logger.info(f"Successfully saved data to {file}")
-    except Exception as e:
-        app.logger.error(f"Error saving to {file}: {str(e)}")
-
-def is_therapy_related(message):
-    therapy_keywords = [
-        "therapy", "therapist", "therapeutic", "counseling", "counselor", "psychotherapy",
-        "mental health", "mental illness", "mental wellness", "psychologist", "psychiatrist",
-        "psychiatric", "psychology", "wellbeing", "well-being", "emotional health", "emotional wellness",
-        "depression", "depressed", "depressing", "anxiety", "anxious", "stress", "stressed", "trauma", "ptsd",
-        "post-traumatic", "bipolar", "schizophrenia", "ocd", "obsessive-compulsive", "adhd", "attention deficit",
-        "borderline", "bpd", "eating disorder", "anorexia", "bulimia", "binge eating", "panic disorder",
-        "social anxiety", "generalized anxiety", "phobia", "insomnia", "sleep disorder", "mood disorder",
-        "personality disorder", "dissociation", "derealization", "depersonalization", "hypomania", "mania",
-        "psychosis", "delusion", "hallucination", "sad", "sadness", "anxious", "stressed", "overwhelmed",
-        "angry", "anger", "frustrated", "lonely", "loneliness", "isolated", "isolation", "guilt", "guilty",
-        "shame", "ashamed", "fear", "fearful", "scared", "worried", "not", "worry", "hopeless", "helpless", "despair",
-        "grief", "grieving", "mourning", "loss", "jealous", "jealousy", "envy", "irritable", "irritation",
-        "nervous", "tense", "restless", "empty", "numb", "feeling", "fine","hurt", "pain", "emotional pain", "heartbroken",
-        "betrayed", "trust issues", "cbt", "cognitive behavioral therapy", "dbt", "dialectical behavior therapy",
-        "emdr", "eye movement", "mindfulness", "meditation", "psychodynamic", "humanistic", "gestalt",
-        "family therapy", "group therapy", "art therapy", "music therapy", "play therapy", "exposure therapy",
-        "narrative therapy", "solution-focused", "acceptance and commitment", "act therapy", "behavioral therapy",
-        "interpersonal therapy", "ipt", "trauma-focused", "somatic", "body-based", "grounding",
-        "breathing exercises", "relaxation techniques", "coping", "self-care", "self-compassion", "self-love",
-        "self-acceptance", "resilience", "self-esteem", "confidence", "motivation", "self-worth", "self-image",
-        "body image", "journaling", "gratitude", "positive thinking", "affirmations", "visualization",
-        "stress management", "time management", "problem-solving", "emotional regulation", "self-soothing",
-        "distraction", "self-awareness", "self-reflection", "boundaries", "assertiveness", "communication skills",
-        "conflict resolution", "sleep", "sleep hygiene", "diet", "nutrition", "exercise", "physical activity",
-        "yoga", "fitness", "health", "healthy habits", "routine", "structure", "balance", "work-life balance",
-        "hydration", "caffeine", "alcohol", "substance use", "smoking", "screen time", "social media",
-        "digital detox", "relationship", "relationships", "family", "feelings", "family issues", "parenting", "marriage",
-        "divorce", "breakup", "separation", "friendship", "friends", "social support", "support system",
-        "community", "connection", "intimacy", "attachment", "codependency", "abandonment", "rejection",
-        "bullying", "harassment", "abuse", "emotional abuse", "physical abuse", "sexual abuse", "neglect",
-        "toxic relationship", "gaslighting", "manipulation", "trust", "betrayal", "infidelity", "cheating",
-        "loneliness in relationships", "addiction", "substance abuse", "alcoholism", "drug use", "recovery",
-        "sobriety", "relapse", "withdrawal", "detox", "rehab", "rehabilitation", "12-step", "aa", "na",
-        "gambling", "pornography", "internet addiction", "gaming addiction", "shopping addiction", "overeating",
-        "compulsion", "suicidal", "suicide", "self-harm", "cutting", "crisis", "emergency", "hotline", "helpline",
-        "panic attack", "breakdown", "meltdown", "overdose", "danger", "safety plan", "urgent", "immediate help",
-        "happiness", "joy", "peace", "calm", "relaxation", "contentment", "fulfillment", "purpose", "meaning",
-        "hope", "optimism", "positivity", "growth", "personal growth", "self-improvement", "self-development",
-        "healing", "closure", "forgiveness", "letting go", "acceptance", "inner peace", "balance", "harmony",
-        "spirituality", "faith", "beliefs", "values", "identity", "self-discovery", "authenticity", "burnout",
-        "work stress", "job stress", "career", "workplace", "productivity", "procrastination", "overwork",
-        "job loss", "unemployment", "not feeling well", "performance anxiety", "imposter syndrome", "perfectionism",
-        "life transition", "change", "adjustment", "midlife crisis", "quarter-life crisis", "aging", "retirement",
-        "pregnancy", "postpartum", "menopause", "chronic illness", "disability", "caregiving", "loss of loved one",
-        "moving", "relocation", "culture shock", "immigration", "acculturation", "identity crisis", "empathy",
-        "compassion", "validation", "support", "encouragement", "motivation", "inspiration", "mental clarity",
-        "focus", "concentration", "memory", "brain fog", "decision-making", "overthinking", "rumination",
-        "intrusive thoughts", "flashbacks", "nightmares", "triggers", "trauma response", "fight or flight",
-        "freeze response", "fawn response", "hypervigilance", "dissociative", "numbing",
-        "emotional intelligence", "eq", "self-regulation", "social skills", "interpersonal skills"
-    ]
-
-    # Convert message to lowercase for case-insensitive matching
-    message_lower = message.lower()
-
-    # Check if any keyword is a substring of the message
-    return any(keyword in message_lower for keyword in therapy_keywords)
-
-def format_api_response(response_text):
-    lines = response_text.split("\n")
-    formatted_lines = []
-    in_list = False
-    step_counter = 0
-    current_description = []
-
-    for line in lines:
-        line = line.strip()
-        if not line:
-            if in_list and current_description:
-                formatted_lines.extend([f"   {desc}" for desc in current_description])
-                current_description = []
-            formatted_lines.append("")
-            continue
+REJECTION_MESSAGE_EN = "I'm sorry, I can only answer questions related to therapy and mental health. Please ask a therapy-related question."
+
+# Fixed strings sent to users, translated ahead of time by prewarm_translation_cache
+CANNED_STRINGS_EN = [REJECTION_MESSAGE_EN]
 
-        step_match_markdown = re.match(r"\*\*(.+?)\*\*", line)
-        step_match_numbered = re.match(r"(\d+)\.\s*(.+)", line)
+XAI_API_URL = os.getenv("XAI_API_URL", "https://api.x.ai/v1/chat/completions")
 
-        if step_match_markdown or step_match_numbered:
-            if in_list and current_description:
-                formatted_lines.extend([f"   {desc}" for desc in current_description])
-                current_description = []
+# Part of the response cache key, so editing the prompt or sampling settings invalidates cached replies
+GENERATION_SETTINGS = {"max_tokens": 1024, "temperature": 0.7, "top_p": 0.9}
+PROMPT_VERSION = hashlib.sha1(json.dumps([SYSTEM_PROMPT, GENERATION_SETTINGS]).encode()).hexdigest()[:12]
 
-            in_list = True
-            step_counter += 1
-            if step_match_markdown:
-                step_title = step_match_markdown.group(1).strip()
+# Optional (RESPONSE_CACHE_ENABLED=1) cache of first-turn replies
+response_cache = ResponseCache()
+single_flight = SingleFlight()
+
+def detect_language(message_cleaned, session_key):
+    detected_lang, confidence = language_identifier.detect_for_session(message_cleaned, session_key)
+    app.logger.debug("Detected language: %s (confidence %.2f)", detected_lang, confidence)
+    # Map the detected language code to a deep-translator compatible code
+    mapped_lang = LANGUAGE_CODE_MAP.get(detected_lang, detected_lang)
+    app.logger.debug("Mapped language: %s -> %s", detected_lang, mapped_lang)
+    return mapped_lang
+
+def translate_to_english(message):
+    # Returns None when every backend failed. User messages are never cached: they are
+    # therapy content, and whole messages almost never repeat anyway.
+    # Try deep-translator first
+    for attempt in range(3):  # Retry up to 3 times
+        try:
+            message_en = get_translator('auto', 'en').translate(message)
+            app.logger.debug("Translated message to English (deep-translator): %d chars", len(message_en))
+            return message_en
+        except Exception as e:
+            app.logger.warning("deep-translator to English failed (attempt %d/3): %s", attempt + 1, e)
+            if attempt < 2:
+                RETRIES.inc(operation="translate_in")
+                sleep_backoff(attempt)
             else:
-                step_title = step_match_numbered.group(2).strip()
-            formatted_lines.append(f"{step_counter}. {step_title}")
+                app.logger.error("deep-translator to English failed after 3 attempts: %s. Trying googletrans.", e)
+    # Fallback to googletrans if available
+    google_translator = get_googletrans()
+    if google_translator:
+        GOOGLETRANS_FALLBACKS.inc(direction="to_en")
+        try:
+            translation = google_translator.translate(message, dest='en')
+            app.logger.debug("Translated message to English (googletrans): %d chars", len(translation.text))
+            return translation.text
+        except Exception as e:
+            app.logger.error("googletrans to English failed: %s", e)
+    else:
+        app.logger.error("googletrans not available")
+    return None
+
+def is_cacheable_line(body):
+    # Canned system strings and short lines such as step headings; nothing conversation-specific
+    return body in CANNED_STRINGS_EN or len(body) <= TRANSLATION_CACHE_MAX_CHARS
+
+def translate_reply_lines(lines, target_lang, translate_fn):
+    # Cached lines are reused; the rest are sent in as few batched requests as the provider allows.
+    # Blank lines, indentation and step numbers stay outside the translated text.
+    translated_lines = [""] * len(lines)
+    pending = []
+    for index, line in enumerate(lines):
+        if not line.strip():
+            continue
+        prefix, body = split_line_prefix(line)
+        cached = translation_cache.get('en', target_lang, body) if is_cacheable_line(body) else None
+        if cached is not None:
+            translated_lines[index] = prefix + cached
         else:
-            if in_list:
-                current_description.append(line)
+            pending.append((index, prefix, body))
+    if pending:
+        bodies = [body for _, _, body in pending]
+        for (index, prefix, body), translated in zip(pending, batch_translate(bodies, translate_fn)):
+            if is_cacheable_line(body):
+                translation_cache.put('en', target_lang, body, translated)
+            translated_lines[index] = prefix + translated
+        app.logger.debug("Batch translated %d lines to %s", len(pending), target_lang)
+    return translated_lines
+
+def translate_from_english(text_en, target_lang, failure_note):
+    lines = text_en.split("\n")
+    for attempt in range(3):  # Retry up to 3 times
+        try:
+            translator_to_original = get_translator('en', target_lang)
+            translated = "\n".join(translate_reply_lines(lines, target_lang, translator_to_original.translate))
+            app.logger.debug("Translated text to %s (deep-translator): %d chars", target_lang, len(translated))
+            return translated
+        except Exception as e:
+            app.logger.warning("deep-translator to %s failed (attempt %d/3): %s", target_lang, attempt + 1, e)
+            if attempt < 2:
+                RETRIES.inc(operation="translate_out")
+                sleep_backoff(attempt)
             else:
-                formatted_lines.append(line)
+                app.logger.error("deep-translator to %s failed after 3 attempts: %s. Trying googletrans.", target_lang, e)
+    google_translator = get_googletrans()
+    if google_translator:
+        GOOGLETRANS_FALLBACKS.inc(direction="from_en")
+        try:
+            translated_lines = translate_reply_lines(
+                lines, target_lang, lambda text: google_translator.translate(text, dest=target_lang).text
+            )
+            translated = "\n".join(translated_lines)
+            app.logger.debug("Translated text to %s (googletrans): %d chars", target_lang, len(translated))
+            return translated
+        except Exception as e:
+            app.logger.error("googletrans to %s failed: %s", target_lang, e)
+    else:
+        app.logger.error("googletrans not available")
+    return text_en + f"\n\n({failure_note})"
+
+def prewarm_translation_cache():
+    # Translate the canned system strings for every mapped language so the first
+    # rejection in each language is served from the cache
+    for target_lang in sorted(set(LANGUAGE_CODE_MAP.values())):
+        for text in CANNED_STRINGS_EN:
+            translate_from_english(text, target_lang, "Note: pre-warm failed")
+    app.logger.info("Translation cache pre-warmed: %s", translation_cache.stats())
+
+def rejection_message_for(detected_lang):
+    if detected_lang == 'en':
+        return REJECTION_MESSAGE_EN
+    return translate_from_english(
+        REJECTION_MESSAGE_EN, detected_lang,
+        f"Note: Translation to {detected_lang} failed, so the response is in English."
+    )
+
+def response_failure_note(detected_lang):
+    return f"Note: Translation to {detected_lang} is not supported, so the response is in English. Please try another language or contact support."
+
+def build_xai_request(model, message_en, stream=False, context_messages=()):
+    # context_messages: earlier turns of the session from context_builder, already token-bounded
+    headers = {
+        "Authorization": f"Bearer {XAI_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": SYSTEM_PROMPT},
+            *context_messages,
+            {"role": "user", "content": message_en}
+        ],
+        **GENERATION_SETTINGS
+    }
+    if stream:
+        payload["stream"] = True
+    return headers, payload
+
+def prepare_chat_request(data):
+    # Steps 1-3 shared by /chat and /chat/stream.
+    # Returns (context, error_response); context carries the detected language and English message.
+    # Sessions are addressed by session_id; session_title is still accepted from older clients
+    message = data.get("message")
+    session_id = data.get("session_id")
+    session_title = data.get("session_title")
+    model = data.get("model", "grok")
+    app.logger.info("chat request model=%s message_chars=%d", model, len(message or ""))
+    if not message:
+        app.logger.error("Empty message received")
+        return None, (jsonify({"error": "Empty message"}), 400)
+    if session_id is not None:
+        # bool is an int subclass; true must not address session 1
+        if not isinstance(session_id, int) or isinstance(session_id, bool) or not history_store.owns_session(session["username"], session_id):
+            app.logger.error("Unknown session %s", session_id)
+            return None, (jsonify({"error": "Session not found"}), 404)
+    elif not session_title:
+        app.logger.error("Session ID missing")
+        return None, (jsonify({"error": "Session ID required"}), 400)
+
+    # Step 1: Detect the language of the user's message
+    # Preprocess the message: replace newlines and ensure it's not empty
+    message_cleaned = message.replace("\n", " ").strip()
+    if not message_cleaned:
+        app.logger.error("Message is empty after preprocessing")
+        return None, (jsonify({"error": "Message cannot be empty"}), 400)
+    with stage(app.logger, "detect", chars=len(message_cleaned)) as fields:
+        detected_lang = detect_language(message_cleaned, (session["username"], session_id or session_title))
+        fields["lang"] = detected_lang
 
-    if in_list and current_description:
-        formatted_lines.extend([f"   {desc}" for desc in current_description])
+    # Step 2: Translate the message to English if it's not already in English
+    message_en = message
+    if detected_lang != 'en':
+        with stage(app.logger, "translate_in", lang=detected_lang, chars=len(message)):
+            message_en = translate_to_english(message)
+        if message_en is None:
+            return None, (jsonify({"error": "Translation to English failed after multiple attempts. Please try again later."}), 500)
 
-    return "\n".join(formatted_lines)
+    # Step 3: Check if the message is therapy-related (using the English translation)
+    with stage(app.logger, "filter") as fields:
+        therapy_related = is_therapy_related(message_en)
+        fields["matched"] = therapy_related
+    if not therapy_related:
+        app.logger.info("Message is not therapy-related (%d chars)", len(message_en))
+        return None, jsonify({"response": rejection_message_for(detected_lang)})
+
+    if session_id is None:
+        session_id, created = history_store.get_or_create_session(session["username"], session_title)
+        if created:
+            app.logger.info("Created new session: %s", session_id)
+
+    return {
+        "username": session["username"],
+        "message": message,
+        "message_en": message_en,
+        "session_id": session_id,
+        "model": model,
+        "detected_lang": detected_lang,
+    }, None
+
+def save_chat_turn(ctx, reply, reply_en):
+    # Step 6: Queue the message and response for the history (store both original and English versions)
+    queued = history_store.queue_message(ctx["username"], ctx["session_id"], {
+        "user": ctx["message"],
+        "user_en": ctx["message_en"],
+        "grok": reply,
+        "grok_en": reply_en
+    })
+    if not queued:
+        # The session was deleted (e.g. /clear_history on another worker) while the reply was generated
+        app.logger.warning("Session %s no longer exists, chat turn not saved", ctx["session_id"])
+        return
+    app.logger.debug("Queued message for session %s", ctx["session_id"])
 
 @app.route("/")
 def index():
@@ -170,30 +344,38 @@ def index():
     return render_template("login.html")
 
 @app.route("/signup", methods=["POST"])
-@limiter.limit("5 per minute")
+@limiter.limit(SIGNUP_RATE_LIMIT)
 def signup():
     data = request.json
     username = data.get("username")
     password = data.get("password")
     if not username or not password:
         return jsonify({"error": "Missing username or password"}), 400
-    users = load_json(USERS_FILE)
-    if username in users:
+    try:
+        with stage(app.logger, "password_hash"):
+            authenticator.signup(username, password)
+    except UserExistsError:
         return jsonify({"error": "User already exists"}), 400
-    users[username] = generate_password_hash(password)
-    save_json(USERS_FILE, users)
+    except HasherBusyError:
+        app.logger.warning("Password hashing queue full, rejecting signup")
+        return jsonify({"error": "Server busy, please try again"}), 503
     return jsonify({"message": "Sign up successful"}), 201
 
 @app.route("/login", methods=["POST"])
-@limiter.limit("10 per minute")
+@limiter.limit(LOGIN_RATE_LIMIT)
 def login():
     data = request.json
     username = data.get("username")
     password = data.get("password")
     if not username or not password:
         return jsonify({"error": "Missing username or password"}), 400
-    users = load_json(USERS_FILE)
-    if username in users and check_password_hash(users[username], password):
+    try:
+        with stage(app.logger, "password_hash"):
+            authenticated = authenticator.login(username, password)
+    except HasherBusyError:
+        app.logger.warning("Password hashing queue full, rejecting login")
+        return jsonify({"error": "Server busy, please try again"}), 503
+    if authenticated:
         session["username"] = username
         return jsonify({"message": "Login successful"}), 200
     return jsonify({"error": "Invalid credentials"}), 401
@@ -211,7 +393,7 @@ def get_models():
     return jsonify({"models": available_models})
 
 @app.route("/create_session", methods=["POST"])
-@limiter.limit("10 per minute")
+@limiter.limit(SESSION_RATE_LIMIT, key_func=user_or_remote_address)
 def create_session():
     if "username" not in session:
         app.logger.error("User not logged in for /create_session")
@@ -222,274 +404,370 @@ def create_session():
         app.logger.error("Session title missing in /create_session")
         return jsonify({"error": "Session title required"}), 400
 
-    history = load_json(HISTORY_FILE)
-    app.logger.info(f"Loaded history in /create_session: {history}")
-    user_history = history.get(session["username"], [])
+    try:
+        session_id = history_store.create_session(session["username"], session_title)
+    except SessionExistsError:
+        app.logger.error("Session '%s' already exists for user %s", session_title, session["username"])
+        return jsonify({"error": "Session title already exists"}), 400
 
-    for entry in user_history:
-        if entry.get("title") == session_title:
-            app.logger.error(f"Session '{session_title}' already exists for user {session['username']}")
-            return jsonify({"error": "Session title already exists"}), 400
+    return jsonify({"message": "Session created successfully", "session_id": session_id}), 200
 
-    user_history.append({
-        "title": session_title,
-        "messages": []
-    })
-    history[session["username"]] = user_history
-    app.logger.info(f"Updated history before saving in /create_session: {history}")
-    save_json(HISTORY_FILE, history)
+# Upstream statuses worth retrying; anything else is returned to the user straight away
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+XAI_MAX_ATTEMPTS = int(os.getenv("XAI_MAX_ATTEMPTS", 3))
 
-    return jsonify({"message": "Session created successfully"}), 200
+def request_completion(headers, payload):
+    # Retries back off exponentially with jitter
+    for attempt in range(XAI_MAX_ATTEMPTS):
+        try:
+            response = http_session.post(XAI_API_URL, headers=headers, json=payload, timeout=HTTP_TIMEOUT)
+        except requests.exceptions.RequestException as e:
+            UPSTREAM_RESPONSES.inc(status="error")
+            if attempt == XAI_MAX_ATTEMPTS - 1:
+                raise
+            app.logger.warning("API request failed (attempt %d/%d): %s", attempt + 1, XAI_MAX_ATTEMPTS, e)
+        else:
+            UPSTREAM_RESPONSES.inc(status=response.status_code)
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt == XAI_MAX_ATTEMPTS - 1:
+                return response
+            app.logger.warning("API returned %s (attempt %d/%d)", response.status_code, attempt + 1, XAI_MAX_ATTEMPTS)
+        RETRIES.inc(operation="completion")
+        sleep_backoff(attempt)
+
+class UpstreamError(Exception):
+    pass
+
+def complete_formatted(headers, payload):
+    # Step 4 for /chat: one completion, formatted. Raises UpstreamError or RequestException.
+    response = request_completion(headers, payload)
+    if app.logger.isEnabledFor(logging.DEBUG):
+        # Decoding the whole body is only worth it when it is actually logged
+        app.logger.debug("API response body: %s", response.text)
+    if response.status_code != 200:
+        raise UpstreamError(f"API error: {response.status_code} - {response.text}")
+    reply_en = response.json()["choices"][0]["message"]["content"]
+    app.logger.debug("API reply (raw, English): %s", reply_en)
+    return format_api_response(reply_en)
+
+def response_cache_key(ctx, context_messages):
+    # Only first turns are cacheable: with session context the prompt is unique to the user
+    if not RESPONSE_CACHE_ENABLED or context_messages:
+        return None
+    return (normalize_prompt(ctx["message_en"]), ctx["model"], PROMPT_VERSION)
+
+def cached_completion(cache_key, headers, payload):
+    # Returns (reply_en, cache result); identical concurrent misses share one upstream call
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        reply_en, upstream_seconds = cached
+        RESPONSE_CACHE_REQUESTS.inc(result="hit")
+        RESPONSE_CACHE_SAVED_SECONDS.inc(upstream_seconds)
+        return reply_en, "hit"
+    call, is_leader = single_flight.join(cache_key)
+    if not is_leader:
+        start = time.perf_counter()
+        reply_en = single_flight.wait(call)
+        if reply_en is not None:
+            RESPONSE_CACHE_REQUESTS.inc(result="coalesced")
+            RESPONSE_CACHE_SAVED_SECONDS.inc(max(0.0, call.upstream_seconds - (time.perf_counter() - start)))
+            return reply_en, "coalesced"
+        # The leader failed; make our own attempt rather than sharing its error
+        RESPONSE_CACHE_REQUESTS.inc(result="miss")
+        return complete_formatted(headers, payload), "miss"
+    RESPONSE_CACHE_REQUESTS.inc(result="miss")
+    start = time.perf_counter()
+    try:
+        reply_en = complete_formatted(headers, payload)
+    except BaseException as e:
+        # Also on cancellation, or followers would wait out SINGLE_FLIGHT_TIMEOUT
+        single_flight.finish(cache_key, call, error=e)
+        raise
+    call.upstream_seconds = time.perf_counter() - start
+    response_cache.put(cache_key, reply_en, call.upstream_seconds)
+    single_flight.finish(cache_key, call, result=reply_en)
+    return reply_en, "miss"
 
 @app.route("/chat", methods=["POST"])
-@limiter.limit("50 per day")
+@limiter.limit(CHAT_RATE_LIMIT, key_func=user_or_remote_address)
 def chat():
     if "username" not in session:
         app.logger.error("User not logged in")
         return jsonify({"error": "Not logged in"}), 401
-    data = request.json
-    message = data.get("message")
-    session_title = data.get("session_title")
-    model = data.get("model", "grok")
-    app.logger.info(f"Received chat request: message='{message}', session_title='{session_title}', model='{model}'")
-    if not message:
-        app.logger.error("Empty message received")
-        return jsonify({"error": "Empty message"}), 400
-    if not session_title:
-        app.logger.error("Session title missing")
-        return jsonify({"error": "Session title required"}), 400
+    ctx, error_response = prepare_chat_request(request.json)
+    if error_response is not None:
+        return error_response
 
-    # Step 1: Detect the language of the user's message using langdetect
-    detected_lang = None
-    # Preprocess the message: replace newlines and ensure it's not empty
-    message_cleaned = message.replace("\n", " ").strip()
-    if not message_cleaned:
-        app.logger.error("Message is empty after preprocessing")
-        return jsonify({"error": "Message cannot be empty"}), 400
-
-    # Retry language detection up to 3 times
-    for attempt in range(3):
-        try:
-            detected_lang = detect(message_cleaned)
-            app.logger.info(f"Detected language (langdetect, attempt {attempt + 1}): {detected_lang}")
-            # If the message contains English-like words, default to English
-            if any(word.lower() in message_cleaned.lower() for word in ["i", "am", "feel", "not", "well", "depressed", "anxious"]):
-                detected_lang = 'en'
-                app.logger.info(f"Defaulting to English ('en') due to English-like words")
-            break
-        except Exception as e:
-            app.logger.warning(f"langdetect attempt {attempt + 1} failed: {str(e)}")
-            if attempt < 2:
-                time.sleep(0.5)  # Wait 0.5 seconds before retrying
+    # Step 4: Process the therapy-related message with the xAI API
+    with stage(app.logger, "context") as fields:
+        context_messages = context_builder.build(ctx["username"], ctx["session_id"])
+        fields["messages"] = len(context_messages)
+    headers, payload = build_xai_request(ctx["model"], ctx["message_en"], context_messages=context_messages)
+    cache_key = response_cache_key(ctx, context_messages)
+    try:
+        with stage(app.logger, "completion", model=ctx["model"]) as stage_fields:
+            if cache_key is None:
+                reply_en = complete_formatted(headers, payload)
             else:
-                app.logger.error("Language detection failed after 3 attempts")
-                detected_lang = 'en'  # Default to English if detection fails
-
-    # Map the detected language code to a deep-translator compatible code
-    original_detected_lang = detected_lang
-    detected_lang = LANGUAGE_CODE_MAP.get(detected_lang, detected_lang)
-    app.logger.info(f"Mapped language: {original_detected_lang} -> {detected_lang}")
+                reply_en, stage_fields["cache"] = cached_completion(cache_key, headers, payload)
+        app.logger.debug("API reply (formatted, English): %s", reply_en)
+    except UpstreamError as e:
+        return jsonify({"error": str(e)}), 500
+    except requests.exceptions.RequestException as e:
+        app.logger.error("API request failed: %s", e)
+        return jsonify({"error": f"API request failed: {str(e)}"}), 500
 
-    # Step 2: Translate the message to English if it's not already in English
-    message_en = message
+    # Step 5: Translate the response back to the original language
+    reply = reply_en
+    detected_lang = ctx["detected_lang"]
     if detected_lang != 'en':
-        # Try deep-translator first
-        for attempt in range(3):  # Retry up to 3 times
-            try:
-                message_en = translator_to_en.translate(message)
-                app.logger.info(f"Translated message to English (deep-translator): {message_en}")
-                break
-            except Exception as e:
-                app.logger.warning(f"deep-translator to English failed (attempt {attempt + 1}/3): {str(e)}")
-                if attempt < 2:
-                    time.sleep(1)  # Wait 1 second before retrying
-                else:
-                    app.logger.error(f"deep-translator to English failed after 3 attempts: {str(e)}. Trying googletrans.")
-                    # Fallback to googletrans if available
-                    if Translator:
-                        try:
-                            google_translator = Translator()
-                            translation = google_translator.translate(message, dest='en')
-                            message_en = translation.text
-                            app.logger.info(f"Translated message to English (googletrans): {message_en}")
-                        except Exception as e:
-                            app.logger.error(f"googletrans to English failed: {str(e)}")
-                            return jsonify({"error": "Translation to English failed after multiple attempts. Please try again later."}), 500
-                    else:
-                        app.logger.error("googletrans not available")
-                        return jsonify({"error": "Translation to English failed after multiple attempts. Please try again later."}), 500
+        with stage(app.logger, "translate_out", lang=detected_lang, chars=len(reply_en)):
+            reply = translate_from_english(reply_en, detected_lang, response_failure_note(detected_lang))
 
-    # Step 3: Check if the message is therapy-related (using the English translation)
-    if not is_therapy_related(message_en):
-        app.logger.info(f"Message '{message_en}' is not therapy-related")
-        # Translate the rejection message back to the original language
-        rejection_message_en = "I'm sorry, I can only answer questions related to therapy and mental health. Please ask a therapy-related question."
+    with stage(app.logger, "save", chars=len(reply) + len(reply_en)):
+        save_chat_turn(ctx, reply, reply_en)
+
+    return jsonify({"response": reply})
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def iter_xai_stream(response):
+    # Yields content deltas from an OpenAI-compatible SSE completion stream.
+    # SSE is always UTF-8, but without a charset requests would decode it as ISO-8859-1
+    response.encoding = "utf-8"
+    for raw_line in response.iter_lines(decode_unicode=True):
+        if not raw_line or not raw_line.startswith("data:"):
+            continue
+        data = raw_line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        try:
+            chunk = json.loads(data)
+        except json.JSONDecodeError:
+            app.logger.warning("Skipping malformed stream chunk (%d bytes)", len(data))
+            continue
+        choices = chunk.get("choices") or []
+        if choices:
+            delta = choices[0].get("delta", {}).get("content")
+            if delta:
+                yield delta
+
+@app.route("/chat/stream", methods=["POST"])
+@limiter.limit(CHAT_RATE_LIMIT, key_func=user_or_remote_address)
+def chat_stream():
+    if "username" not in session:
+        app.logger.error("User not logged in")
+        return jsonify({"error": "Not logged in"}), 401
+    ctx, error_response = prepare_chat_request(request.json)
+    if error_response is not None:
+        return error_response
+
+    # Step 4: Open a streaming completion before committing to an event stream
+    with stage(app.logger, "context") as fields:
+        context_messages = context_builder.build(ctx["username"], ctx["session_id"])
+        fields["messages"] = len(context_messages)
+    headers, payload = build_xai_request(ctx["model"], ctx["message_en"], stream=True, context_messages=context_messages)
+    detected_lang = ctx["detected_lang"]
+
+    def generate_complete(reply_en):
+        # A reply that is already finished (cached, or another request's) goes out as one delta
+        reply = reply_en
         if detected_lang != 'en':
-            for attempt in range(3):  # Retry up to 3 times
-                try:
-                    translator_to_original = GoogleTranslator(source='en', target=detected_lang)
-                    rejection_message = translator_to_original.translate(rejection_message_en)
-                    app.logger.info(f"Translated rejection message to {detected_lang} (deep-translator): {rejection_message}")
-                    break
-                except Exception as e:
-                    app.logger.warning(f"deep-translator of rejection message failed (attempt {attempt + 1}/3): {str(e)}")
-                    if attempt < 2:
-                        time.sleep(1)  # Wait 1 second before retrying
-                    else:
-                        app.logger.error(f"deep-translator of rejection message failed after 3 attempts: {str(e)}. Trying googletrans.")
-                        if Translator:
-                            try:
-                                google_translator = Translator()
-                                translation = google_translator.translate(rejection_message_en, dest=detected_lang)
-                                rejection_message = translation.text
-                                app.logger.info(f"Translated rejection message to {detected_lang} (googletrans): {rejection_message}")
-                            except Exception as e:
-                                app.logger.error(f"googletrans of rejection message failed: {str(e)}")
-                                rejection_message = rejection_message_en
-                                rejection_message += f"\n\n(Note: Translation to {detected_lang} failed, so the response is in English.)"
-                        else:
-                            app.logger.error("googletrans not available")
-                            rejection_message = rejection_message_en
-                            rejection_message += f"\n\n(Note: Translation to {detected_lang} failed, so the response is in English.)"
+            reply = translate_from_english(reply_en, detected_lang, response_failure_note(detected_lang))
+        save_chat_turn(ctx, reply, reply_en)
+        yield sse_event("delta", {"text": reply})
+        yield sse_event("done", {"response": reply})
+
+    cache_key = response_cache_key(ctx, context_messages)
+    cached = response_cache.get(cache_key) if cache_key is not None else None
+    if cached is not None:
+        RESPONSE_CACHE_REQUESTS.inc(result="hit")
+        RESPONSE_CACHE_SAVED_SECONDS.inc(cached[1])
+        return Response(stream_with_context(generate_complete(cached[0])), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    flight = None
+    if cache_key is not None:
+        # Identical concurrent misses share the leader's upstream stream
+        call, is_leader = single_flight.join(cache_key)
+        if not is_leader:
+            wait_start = time.perf_counter()
+            reply_en = single_flight.wait(call)
+            if reply_en is not None:
+                RESPONSE_CACHE_REQUESTS.inc(result="coalesced")
+                RESPONSE_CACHE_SAVED_SECONDS.inc(max(0.0, call.upstream_seconds - (time.perf_counter() - wait_start)))
+                return Response(stream_with_context(generate_complete(reply_en)), mimetype="text/event-stream",
+                                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+            # The leader failed; make our own attempt rather than sharing its error
         else:
-            rejection_message = rejection_message_en
-        return jsonify({"response": rejection_message})
+            flight = call
+        RESPONSE_CACHE_REQUESTS.inc(result="miss")
 
-    # Step 4: Process the therapy-related message with the xAI API
-    system_prompt = (
-        "You are a professional therapy doctor specializing in mental health. "
-        "Only answer questions related to therapy, mental health, emotional wellbeing, and related topics. "
-        "If a question is not related to therapy, politely decline to answer and ask the user to ask a therapy-related question."
-    )
+    def finish_flight(reply_en=None):
+        if flight is not None:
+            single_flight.finish(cache_key, flight, result=reply_en)
 
-    url = "https://api.x.ai/v1/chat/completions"
-    headers = {
-        "Authorization": f"Bearer {XAI_API_KEY}",
-        "Content-Type": "application/json"
-    }
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": message_en}
-        ],
-        "max_tokens": 1024,
-        "temperature": 0.7,
-        "top_p": 0.9
-    }
+    stream_start = time.perf_counter()
     try:
-        app.logger.info("Sending request to xAI API")
-        response = requests.post(url, headers=headers, json=payload)
-        app.logger.info(f"API response: {response.status_code} - {response.text}")
+        with stage(app.logger, "completion_open", model=ctx["model"]) as stage_fields:
+            response = http_session.post(XAI_API_URL, headers=headers, json=payload, stream=True, timeout=HTTP_TIMEOUT)
+            stage_fields["status"] = response.status_code
+        UPSTREAM_RESPONSES.inc(status=response.status_code)
         if response.status_code != 200:
+            app.logger.warning("API response status=%s bytes=%d", response.status_code, len(response.content))
+            finish_flight()
             return jsonify({"error": f"API error: {response.status_code} - {response.text}"}), 500
-        reply_en = response.json()["choices"][0]["message"]["content"]
-        app.logger.info(f"API reply (raw, English): {reply_en}")
-        
-        # Format the API response
-        reply_en = format_api_response(reply_en)
-        app.logger.info(f"API reply (formatted, English): {reply_en}")
     except requests.exceptions.RequestException as e:
-        app.logger.error(f"API request failed: {str(e)}")
-        return jsonify({"error": "API request failed: {str(e)}"}), 500
+        UPSTREAM_RESPONSES.inc(status="error")
+        app.logger.error("API request failed: %s", e)
+        finish_flight()
+        return jsonify({"error": f"API request failed: {str(e)}"}), 500
+    except BaseException:
+        finish_flight()
+        raise
+
+    def stream_reply():
+        formatter = ResponseFormatter()
+        received_chars = 0
+        emitted_en = []      # Formatted English lines already finalized
+        pending_en = []      # Finalized lines not yet sent (held until a paragraph break when translating)
+        sent = []            # Text chunks sent to the browser, joined they form the reply
+
+        def flush(lines):
+            if detected_lang == 'en':
+                text = "\n".join(lines)
+            else:
+                text = translate_from_english("\n".join(lines), detected_lang, response_failure_note(detected_lang))
+            chunk = ("\n" if sent else "") + text
+            sent.append(chunk)
+            return sse_event("delta", {"text": chunk})
 
-    # Step 5: Translate the response back to the original language
-    reply = reply_en
-    if detected_lang != 'en':
-        for attempt in range(3):  # Retry up to 3 times
+        with stage(app.logger, "completion_stream", lang=detected_lang) as stream_fields:
             try:
-                translator_to_original = GoogleTranslator(source='en', target=detected_lang)
-                # Split the response into smaller chunks to avoid translation limits
-                lines = reply_en.split("\n")
-                translated_lines = []
-                for line in lines:
-                    if line.strip():
-                        translated_line = translator_to_original.translate(line)
-                        translated_lines.append(translated_line)
-                    else:
-                        translated_lines.append("")
-                reply = "\n".join(translated_lines)
-                app.logger.info(f"Translated response to {detected_lang} (deep-translator): {reply}")
-                break
-            except Exception as e:
-                app.logger.warning(f"deep-translator of response failed (attempt {attempt + 1}/3): {str(e)}")
-                if attempt < 2:
-                    time.sleep(1)  # Wait 1 second before retrying
-                else:
-                    app.logger.error(f"deep-translator of response failed after 3 attempts: {str(e)}. Trying googletrans.")
-                    if Translator:
-                        try:
-                            google_translator = Translator()
-                            # Split the response into smaller chunks
-                            lines = reply_en.split("\n")
-                            translated_lines = []
-                            for line in lines:
-                                if line.strip():
-                                    translation = google_translator.translate(line, dest=detected_lang)
-                                    translated_lines.append(translation.text)
-                                else:
-                                    translated_lines.append("")
-                            reply = "\n".join(translated_lines)
-                            app.logger.info(f"Translated response to {detected_lang} (googletrans): {reply}")
-                        except Exception as e:
-                            app.logger.error(f"googletrans of response failed: {str(e)}")
-                            reply = reply_en  # Fallback to English if translation fails
-                            reply += f"\n\n(Note: Translation to {detected_lang} is not supported, so the response is in English. Please try another language or contact support.)"
-                    else:
-                        app.logger.error("googletrans not available")
-                        reply = reply_en
-                        reply += f"\n\n(Note: Translation to {detected_lang} is not supported, so the response is in English. Please try another language or contact support.)"
-
-    # Step 6: Save the message and response in the history (store both original and English versions)
-    history = load_json(HISTORY_FILE)
-    app.logger.info(f"Loaded history: {history}")
-    user_history = history.get(session["username"], [])
-    session_index = -1
-    for i, entry in enumerate(user_history):
-        if entry.get("title") == session_title:
-            session_index = i
-            break
+                for delta in iter_xai_stream(response):
+                    received_chars += len(delta)
+                    new_lines = formatter.feed(delta)
+                    if not new_lines:
+                        continue
+                    emitted_en.extend(new_lines)
+                    pending_en.extend(new_lines)
+                    # English goes out line by line; other languages are translated per paragraph
+                    if detected_lang == 'en' or pending_en[-1] == "":
+                        yield flush(pending_en)
+                        pending_en = []
+            except requests.exceptions.RequestException as e:
+                app.logger.error("API stream failed: %s", e)
+                yield sse_event("error", {"error": f"API request failed: {str(e)}"})
+                return
+            finally:
+                response.close()
+                stream_fields["chars"] = received_chars
+                stream_fields["events"] = len(sent)
+
+        # Step 5: Send whatever is left once the stream ends
+        last_lines = formatter.close()
+        emitted_en.extend(last_lines)
+        pending_en.extend(last_lines)
+        reply_en = "\n".join(emitted_en)
+        app.logger.debug("API reply (formatted, English): %s", reply_en)
+        if cache_key is not None:
+            upstream_seconds = time.perf_counter() - stream_start
+            response_cache.put(cache_key, reply_en, upstream_seconds)
+            if flight is not None:
+                flight.upstream_seconds = upstream_seconds
+            finish_flight(reply_en)
+        if pending_en:
+            yield flush(pending_en)
+        reply = "".join(sent)
+        with stage(app.logger, "save", chars=len(reply) + len(reply_en)):
+            save_chat_turn(ctx, reply, reply_en)
+        yield sse_event("done", {"response": reply})
+
+    def generate():
+        # Followers must never wait on a leader whose stream failed or was abandoned
+        try:
+            yield from stream_reply()
+        finally:
+            finish_flight()
 
-    if session_index == -1:
-        user_history.append({
-            "title": session_title,
-            "messages": [{"user": message, "user_en": message_en, "grok": reply, "grok_en": reply_en}]
-        })
-        app.logger.info(f"Created new session: {session_title}")
-    else:
-        user_history[session_index]["messages"].append({
-            "user": message,
-            "user_en": message_en,
-            "grok": reply,
-            "grok_en": reply_en
-        })
-        app.logger.info(f"Appended to existing session: {session_title}")
-
-    history[session["username"]] = user_history
-    app.logger.info(f"Updated history before saving: {history}")
-    save_json(HISTORY_FILE, history)
+    streamed = Response(stream_with_context(generate()), mimetype="text/event-stream",
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+    # In case the body is never iterated at all
+    streamed.call_on_close(finish_flight)
+    return streamed
 
-    return jsonify({"response": reply})
 
 @app.route("/history", methods=["GET"])
 def get_history():
     if "username" not in session:
         app.logger.error("User not logged in for /history")
         return jsonify({"error": "Not logged in"}), 401
-    history = load_json(HISTORY_FILE)
-    app.logger.info(f"Returning history for user {session['username']}: {history.get(session['username'], [])}")
-    return jsonify(history.get(session['username'], []))
+    user_history = history_store.get_history(session["username"])
+    app.logger.info("Returning history sessions=%d messages=%d", len(user_history), sum(len(s["messages"]) for s in user_history))
+    return jsonify(user_history)
+
+@app.route("/sessions", methods=["GET"])
+def list_sessions():
+    if "username" not in session:
+        app.logger.error("User not logged in for /sessions")
+        return jsonify({"error": "Not logged in"}), 401
+    return jsonify({"sessions": history_store.list_sessions(session["username"])})
+
+@app.route("/sessions/<int:session_id>", methods=["PATCH"])
+def rename_session(session_id):
+    if "username" not in session:
+        app.logger.error("User not logged in for /sessions/<id>")
+        return jsonify({"error": "Not logged in"}), 401
+    session_title = (request.json or {}).get("session_title")
+    if not session_title:
+        return jsonify({"error": "Session title required"}), 400
+    try:
+        renamed = history_store.rename_session(session["username"], session_id, session_title)
+    except SessionExistsError:
+        return jsonify({"error": "Session title already exists"}), 400
+    if not renamed:
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify({"message": "Session renamed", "session_id": session_id}), 200
+
+@app.route("/sessions/<int:session_id>/messages", methods=["GET"])
+def get_session_messages(session_id):
+    # ?before=<id> pages backwards, ?after=<id> returns only newer messages
+    if "username" not in session:
+        app.logger.error("User not logged in for /sessions/<id>/messages")
+        return jsonify({"error": "Not logged in"}), 401
+    limit = max(1, min(request.args.get("limit", HISTORY_PAGE_SIZE, type=int), MAX_HISTORY_PAGE_SIZE))
+    messages, next_cursor = history_store.get_messages(
+        session["username"], session_id,
+        before=request.args.get("before", type=int),
+        after=request.args.get("after", type=int),
+        limit=limit,
+        include_english=request.args.get("include_english") == "1",
+    )
+    if messages is None:
+        return jsonify({"error": "Session not found"}), 404
+    return jsonify({"messages": messages, "next_cursor": next_cursor})
+
+@app.route("/translation_cache/stats", methods=["GET"])
+def get_translation_cache_stats():
+    if "username" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    return jsonify(translation_cache.stats())
+
+@app.route("/metrics", methods=["GET"])
+@limiter.exempt
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/clear_history", methods=["POST"])
 def clear_history():
     if "username" not in session:
         app.logger.error("User not logged in for /clear_history")
         return jsonify({"error": "Not logged in"}), 401
-    history = load_json(HISTORY_FILE)
-    history[session["username"]] = []
-    save_json(HISTORY_FILE, history)
-    app.logger.info(f"Cleared history for user {session['username']}")
+    history_store.clear(session["username"])
+    app.logger.info("Cleared history for user %s", session["username"])
     return jsonify({"message": "History cleared"}), 200
 
+if os.getenv("TRANSLATION_PREWARM", "1") == "1":
+    threading.Thread(target=prewarm_translation_cache, name="translation-prewarm", daemon=True).start()
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.getenv("PORT", 5001)))
@@ -0,0 +1,221 @@
+import json
+import logging
+import os
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from sqlite_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# werkzeug method string; stored hashes made with other parameters are upgraded on the next login
+PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+# hashlib.scrypt releases the GIL, so this is how many hashes run in parallel at most
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", 2))
+# Hashes waiting beyond this are refused instead of queueing behind a login burst
+AUTH_HASH_QUEUE = int(os.getenv("AUTH_HASH_QUEUE", 32))
+AUTH_HASH_TIMEOUT = float(os.getenv("AUTH_HASH_TIMEOUT", 10))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    username TEXT PRIMARY KEY,
+    password_hash TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+class UserExistsError(Exception):
+    pass
+
+
+class HasherBusyError(Exception):
+    pass
+
+
+class UserStore:
+    """Username -> password hash, in SQLite with an in-memory cache.
+
+    The primary key makes signup a single atomic INSERT, so concurrent signups
+    can't overwrite each other the way rewriting users.json did.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pool = ConnectionPool(path, ("PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL"))
+        self._cache = {}
+        self._lock = threading.Lock()
+        self._conn().executescript(SCHEMA)
+
+    def _conn(self):
+        return self._pool.connection()
+
+    def is_empty(self):
+        return self._conn().execute("SELECT 1 FROM users LIMIT 1").fetchone() is None
+
+    def get_hash(self, username):
+        with self._lock:
+            if username in self._cache:
+                return self._cache[username]
+        row = self._conn().execute(
+            "SELECT password_hash FROM users WHERE username = ?", (username,)
+        ).fetchone()
+        if row is None:
+            # Misses aren't cached; the user may sign up on another worker
+            return None
+        with self._lock:
+            self._cache[username] = row[0]
+        return row[0]
+
+    def add(self, username, password_hash):
+        try:
+            self._conn().execute(
+                "INSERT INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                (username, password_hash, time.time()),
+            )
+        except sqlite3.IntegrityError:
+            raise UserExistsError(username)
+        with self._lock:
+            self._cache[username] = password_hash
+
+    def update_hash(self, username, old_hash, new_hash):
+        # Compare-and-set, so a rehash can't undo a password change made meanwhile
+        cur = self._conn().execute(
+            "UPDATE users SET password_hash = ? WHERE username = ? AND password_hash = ?",
+            (new_hash, username, old_hash),
+        )
+        with self._lock:
+            self._cache.pop(username, None)
+        return cur.rowcount == 1
+
+    def migrate_from_json(self, json_path):
+        """One-shot import of users.json into an empty store. Returns the number of users imported."""
+        try:
+            with open(json_path, "r") as f:
+                users = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error("Error loading %s for migration: %s", json_path, e)
+            return 0
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            # Checked under the write lock, so concurrently starting workers import once
+            if conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() is not None:
+                logger.info("User store already populated, skipping import of %s", json_path)
+                return 0
+            imported = 0
+            for username, password_hash in users.items():
+                imported += conn.execute(
+                    "INSERT OR IGNORE INTO users (username, password_hash, created_at) VALUES (?, ?, ?)",
+                    (username, password_hash, time.time()),
+                ).rowcount
+        logger.info("Migrated %d users from %s", imported, json_path)
+        return imported
+
+
+def hash_executor(workers):
+    # Under gevent (serve.py) pool threads would be greenlets, and a CPU-bound hash
+    # would stall every request on the hub; gevent's executor runs on native threads
+    monkey = sys.modules.get("gevent.monkey")
+    if monkey is not None and monkey.is_module_patched("threading"):
+        from gevent.threadpool import ThreadPoolExecutor as NativeThreadPoolExecutor
+        return NativeThreadPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+
+
+class PasswordHasher:
+    """Runs password hashing on a small dedicated pool.
+
+    A burst of logins then occupies at most `workers` CPUs instead of every
+    request thread, and a full queue is refused rather than stalling chat traffic.
+    """
+
+    def __init__(self, method=PASSWORD_HASH_METHOD, workers=AUTH_HASH_WORKERS, queue_size=AUTH_HASH_QUEUE):
+        self.method = method
+        self.workers = workers
+        self._executor = hash_executor(workers)
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._in_flight = 0
+        self._count_lock = threading.Lock()
+        self._dummy_hash = None
+        self._dummy_lock = threading.Lock()
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusyError()
+        self._count(1)
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._done()
+            raise
+        future.add_done_callback(lambda _: self._done())
+        try:
+            return future.result(timeout=AUTH_HASH_TIMEOUT)
+        except FutureTimeoutError:
+            raise HasherBusyError()
+
+    def _count(self, delta):
+        with self._count_lock:
+            self._in_flight += delta
+
+    def _done(self):
+        self._count(-1)
+        self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def dummy_hash(self):
+        # Hash of a random password with the current parameters, checked for unknown users.
+        # Made on the pool too: under gevent an inline hash would stall every request.
+        with self._dummy_lock:
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hash(secrets.token_urlsafe(16))
+            return self._dummy_hash
+
+    def needs_rehash(self, password_hash):
+        # werkzeug hashes are "method$salt$hash"; the method part carries the parameters
+        return password_hash.split("$", 1)[0] != self.dummy_hash().split("$", 1)[0]
+
+    def pending(self):
+        # Hashes waiting for a worker
+        with self._count_lock:
+            return max(0, self._in_flight - self.workers)
+
+
+class Authenticator:
+    def __init__(self, store, hasher):
+        self.store = store
+        self.hasher = hasher
+
+    def signup(self, username, password):
+        # Raises UserExistsError or HasherBusyError
+        if self.store.get_hash(username) is not None:
+            raise UserExistsError(username)
+        self.store.add(username, self.hasher.hash(password))
+
+    def login(self, username, password):
+        stored = self.store.get_hash(username)
+        if stored is None:
+            # Same work as a real check, so response time doesn't reveal which usernames exist
+            self.hasher.verify(self.hasher.dummy_hash(), password)
+            return False
+        if not self.hasher.verify(stored, password):
+            return False
+        try:
+            if self.hasher.needs_rehash(stored):
+                self.store.update_hash(username, stored, self.hasher.hash(password))
+                logger.info("Upgraded password hash for user %s", username)
+        except HasherBusyError:
+            pass  # Try again on the next login
+        return True
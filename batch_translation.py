@@ -0,0 +1,62 @@
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+# deep-translator rejects payloads of 5000 characters or more
+MAX_BATCH_CHARS = 4500
+
+# Placed on its own line between segments; translators leave it alone
+SENTINEL = "@@@"
+SENTINEL_SPLIT = re.compile(r"\s*@\s*@\s*@\s*")
+
+# Indentation and step numbers are kept out of the translation and re-attached afterwards
+LINE_PREFIX = re.compile(r"^(\s*(?:\d+\.\s+)?)(.*)$", re.DOTALL)
+
+
+def split_line_prefix(line):
+    match = LINE_PREFIX.match(line)
+    return match.group(1), match.group(2)
+
+
+def pack_chunks(segments, max_chars=MAX_BATCH_CHARS):
+    # Greedily groups segment indexes so each joined chunk stays under max_chars
+    separator_len = len(SENTINEL) + 2
+    chunks = []
+    current = []
+    current_len = 0
+    for index, segment in enumerate(segments):
+        added = len(segment) + (separator_len if current else 0)
+        if current and current_len + added > max_chars:
+            chunks.append(current)
+            current = []
+            current_len = 0
+            added = len(segment)
+        current.append(index)
+        current_len += added
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def batch_translate(segments, translate_fn, max_chars=MAX_BATCH_CHARS):
+    """Translate a list of single-line segments with as few translate_fn calls as possible.
+
+    Segments are joined with a sentinel line, translated per chunk and split back
+    out in order. A chunk whose sentinels don't survive translation is retried one
+    segment at a time.
+    """
+    results = [None] * len(segments)
+    for chunk in pack_chunks(segments, max_chars):
+        if len(chunk) == 1:
+            results[chunk[0]] = translate_fn(segments[chunk[0]])
+            continue
+        joined = f"\n{SENTINEL}\n".join(segments[i] for i in chunk)
+        translated = translate_fn(joined) or ""
+        parts = SENTINEL_SPLIT.split(translated.strip())
+        if len(parts) != len(chunk):
+            logger.warning("Batch translation returned %d segments for %d, translating one by one", len(parts), len(chunk))
+            parts = [translate_fn(segments[i]) for i in chunk]
+        for i, part in zip(chunk, parts):
+            results[i] = part.strip()
+    return results
@@ -0,0 +1,156 @@
+"""Equivalence check and throughput of the incremental reply formatter vs. the original one.
+
+Usage: python bench/bench_formatting.py [cases] [reply_lines]
+
+Generates random replies from the pieces that matter to the formatter (bold and
+numbered headings, blank and whitespace-only lines, stray "**" and digits), checks
+that batch and randomly chunked streaming output both match the original
+implementation, then times both on large generated replies. Exits non-zero on any
+mismatch.
+"""
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from formatting import ResponseFormatter, format_api_response
+
+
+def legacy_format_api_response(response_text):
+    lines = response_text.split("\n")
+    formatted_lines = []
+    in_list = False
+    step_counter = 0
+    current_description = []
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            if in_list and current_description:
+                formatted_lines.extend([f"   {desc}" for desc in current_description])
+                current_description = []
+            formatted_lines.append("")
+            continue
+
+        step_match_markdown = re.match(r"\*\*(.+?)\*\*", line)
+        step_match_numbered = re.match(r"(\d+)\.\s*(.+)", line)
+
+        if step_match_markdown or step_match_numbered:
+            if in_list and current_description:
+                formatted_lines.extend([f"   {desc}" for desc in current_description])
+                current_description = []
+
+            in_list = True
+            step_counter += 1
+            if step_match_markdown:
+                step_title = step_match_markdown.group(1).strip()
+            else:
+                step_title = step_match_numbered.group(2).strip()
+            formatted_lines.append(f"{step_counter}. {step_title}")
+        else:
+            if in_list:
+                current_description.append(line)
+            else:
+                formatted_lines.append(line)
+
+    if in_list and current_description:
+        formatted_lines.extend([f"   {desc}" for desc in current_description])
+
+    return "\n".join(formatted_lines)
+
+
+PIECES = [
+    "**", "*", "1.", "12.", "3", ".", " ", "  ", "\t", "\r", "\n", "\n\n", "Breathe", "slowly",
+    "Step", "**Rest**", "2. Walk", "١٢.", "　", " ", "x", ":", "-",
+]
+
+
+def random_reply(rng, max_pieces=40):
+    return "".join(rng.choice(PIECES) for _ in range(rng.randint(0, max_pieces)))
+
+
+def stream_format(text, rng):
+    formatter = ResponseFormatter()
+    lines = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 12)
+        lines.extend(formatter.feed(text[position:position + size]))
+        position += size
+    lines.extend(formatter.close())
+    return "\n".join(lines)
+
+
+def prefix_reformat(text):
+    # What /chat/stream used to do: reformat everything received at every newline
+    emitted = 0
+    for end in range(len(text)):
+        if text[end] == "\n":
+            emitted = len(legacy_format_api_response(text[:end]).split("\n"))
+    return emitted
+
+
+def check_equivalence(cases, seed=0):
+    rng = random.Random(seed)
+    for case in range(cases):
+        text = random_reply(rng)
+        expected = legacy_format_api_response(text)
+        for name, actual in (("batch", format_api_response(text)), ("stream", stream_format(text, rng))):
+            if actual != expected:
+                print(f"MISMATCH ({name}) on case {case}: {text!r}")
+                print(f"  expected {expected!r}")
+                print(f"  actual   {actual!r}")
+                return False
+    return True
+
+
+def large_reply(lines, seed=1):
+    rng = random.Random(seed)
+    out = ["Here are some things that can help:", ""]
+    for i in range(lines):
+        kind = rng.random()
+        if kind < 0.1:
+            out.append(f"**Step {i}**")
+        elif kind < 0.2:
+            out.append(f"{i}. Try a short walk outside")
+        elif kind < 0.3:
+            out.append("")
+        else:
+            out.append("  Notice how your body feels and breathe out slowly for six counts.  ")
+    return "\n".join(out)
+
+
+def timed(fn, text, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - start) / repeat
+
+
+if __name__ == "__main__":
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    reply_lines = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+    if not check_equivalence(cases):
+        sys.exit(1)
+    print(f"{cases} random replies: batch and streamed output identical to the original")
+
+    text = large_reply(reply_lines)
+    megabytes = len(text.encode()) / 1e6
+    legacy = timed(legacy_format_api_response, text, 3)
+    batch = timed(format_api_response, text, 3)
+    stream = timed(lambda t: stream_format(t, random.Random(2)), text, 3)
+    print(f"reply of {reply_lines} lines ({megabytes:.1f} MB)")
+    print(f"original:     {megabytes / legacy:8.1f} MB/s")
+    print(f"batch:        {megabytes / batch:8.1f} MB/s ({legacy / batch:.1f}x)")
+    print(f"streamed:     {megabytes / stream:8.1f} MB/s (1-12 char chunks)")
+
+    # The old streaming path is quadratic, so it only gets a small reply
+    small = large_reply(2000)
+    small_mb = len(small.encode()) / 1e6
+    old_stream = timed(prefix_reformat, small, 1)
+    new_stream = timed(lambda t: stream_format(t, random.Random(2)), small, 3)
+    print(f"streaming a 2000-line reply: prefix re-format {old_stream * 1000:.0f} ms, "
+          f"incremental {new_stream * 1000:.1f} ms ({small_mb:.2f} MB)")
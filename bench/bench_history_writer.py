@@ -0,0 +1,66 @@
+"""Benchmark: inline message appends vs. the write-behind HistoryWriter.
+
+Usage: python bench/bench_history_writer.py [threads] [messages_per_thread]
+
+Reports the time a request thread spends saving a chat turn and the overall
+throughput until everything is committed. Inline appends are measured with
+synchronous=NORMAL (the store's default) and FULL (one fsync per message, the
+durability the writer gives per batch). Inline NORMAL is what the app does by
+default; write-behind (HISTORY_WRITE_BEHIND=1) is for single-worker deployments.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import HistoryStore
+
+MESSAGE = {"user": "I feel anxious about work", "user_en": None,
+           "grok": "Take a slow breath.\n\n1. Name the feeling\n   Write it down.", "grok_en": None}
+
+
+def run(mode, threads, per_thread):
+    with tempfile.TemporaryDirectory() as workdir:
+        store = HistoryStore(os.path.join(workdir, "history.db"))
+        writer = store.start_writer() if mode == "write-behind" else None
+        sessions = [store.create_session(f"user{i}", "bench") for i in range(threads)]
+        waits = []
+        lock = threading.Lock()
+
+        def worker(i):
+            if mode == "inline FULL":
+                store._conn().execute("PRAGMA synchronous=FULL")
+            local = []
+            for _ in range(per_thread):
+                start = time.perf_counter()
+                store.queue_message(f"user{i}", sessions[i], MESSAGE)
+                local.append(time.perf_counter() - start)
+            with lock:
+                waits.extend(local)
+
+        start = time.perf_counter()
+        workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        if writer is not None:
+            writer.flush()
+        elapsed = time.perf_counter() - start
+        if writer is not None:
+            writer.close()
+        waits.sort()
+        total = threads * per_thread
+        batches = f"  {writer.batches} batches" if writer is not None else ""
+        print(f"{mode:13} {total / elapsed:9.0f} msg/s  save p50 {waits[len(waits) // 2] * 1e6:8.0f} us  "
+              f"p99 {waits[int(len(waits) * 0.99)] * 1e6:8.0f} us{batches}")
+
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    per_thread = int(sys.argv[2]) if len(sys.argv) > 2 else 250
+    for mode in ("inline NORMAL", "inline FULL", "write-behind"):
+        run(mode, threads, per_thread)
@@ -0,0 +1,54 @@
+"""Benchmark: per-call requests.post vs. the shared pooled session against a local mock server.
+
+Usage: python bench/bench_http_pool.py [requests]
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clients import HTTP_TIMEOUT, build_http_session
+
+REPLY = json.dumps({"choices": [{"message": {"content": "Take a slow breath."}}]}).encode()
+
+
+class MockCompletionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(REPLY)))
+        self.end_headers()
+        self.wfile.write(REPLY)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(post, url, count):
+    payload = {"model": "grok-2", "messages": [{"role": "user", "content": "I feel anxious"}]}
+    start = time.perf_counter()
+    for _ in range(count):
+        post(url, json=payload, timeout=HTTP_TIMEOUT).json()
+    return (time.perf_counter() - start) / count * 1000
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockCompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1/chat/completions"
+
+    unpooled = run(requests.post, url, count)
+    pooled = run(build_http_session().post, url, count)
+    print(f"requests.post (new connection each call): {unpooled:.3f} ms/request")
+    print(f"shared session (keep-alive pool):         {pooled:.3f} ms/request")
+    server.shutdown()
@@ -0,0 +1,68 @@
+"""Accuracy and throughput of the language identifier on a labelled corpus.
+
+Usage: python bench/bench_langid.py [iterations]
+
+langdetect is timed on the same corpus when installed, for comparison, and the
+script exits non-zero if the identifier is less accurate than langdetect.
+"""
+import os
+import sys
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from langid import LanguageIdentifier
+
+CORPUS = os.path.join(ROOT, "bench", "langid_corpus.tsv")
+
+
+def load_corpus(path=CORPUS):
+    with open(path, encoding="utf-8") as f:
+        return [tuple(line.rstrip("\n").split("\t", 1)) for line in f if line.strip()]
+
+
+def evaluate(name, detect, corpus, iterations):
+    errors = Counter()
+    correct = 0
+    for label, text in corpus:
+        predicted = detect(text)
+        if predicted == label:
+            correct += 1
+        else:
+            errors[(label, predicted)] += 1
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for _, text in corpus:
+            detect(text)
+    elapsed = time.perf_counter() - start
+    per_call_us = elapsed / (iterations * len(corpus)) * 1e6
+    print(f"{name:12} accuracy {correct}/{len(corpus)} ({correct / len(corpus):.0%})  {per_call_us:9.1f} us/message")
+    for (label, predicted), count in errors.most_common():
+        print(f"{'':12}   {label} -> {predicted} x{count}")
+    return correct
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    corpus = load_corpus()
+    identifier = LanguageIdentifier()
+    correct = evaluate("langid", lambda text: identifier.detect(text)[0], corpus, iterations)
+    try:
+        from langdetect import DetectorFactory, detect
+    except ImportError:
+        print("langdetect not installed, skipping comparison")
+    else:
+        DetectorFactory.seed = 0
+
+        def langdetect_or_none(text):
+            try:
+                return detect(text)
+            except Exception:
+                return None
+
+        baseline = evaluate("langdetect", langdetect_or_none, corpus, max(1, iterations // 10))
+        if correct < baseline:
+            print(f"FAIL langid is less accurate than langdetect ({correct} < {baseline})")
+            sys.exit(1)
@@ -0,0 +1,37 @@
+"""Benchmark: rate-limit hits through plain vs. leased Redis storage, against the local Redis stand-in.
+
+Usage: python bench/bench_ratelimit.py [hits]
+
+Runs the app's default limits and one large limit that leasing is built for.
+"""
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import FixedWindowRateLimiter
+
+import ratelimit  # noqa: F401  Registers the leased+ storage schemes
+from redis_standin import start_redis_standin
+
+# Defaults from app.py: DEFAULT_RATE_LIMITS, CHAT_RATE_LIMIT, SIGNUP_RATE_LIMIT, LOGIN/SESSION_RATE_LIMIT
+APP_LIMITS = ["800 per day", "10 per minute", "50 per day", "5 per minute"]
+
+if __name__ == "__main__":
+    hits = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    server = start_redis_standin()
+    port = server.server_address[1]
+    for limit in APP_LIMITS + [f"{hits * 2} per day"]:
+        item = parse(limit)
+        for scheme in ("redis", "leased+redis"):
+            storage = storage_from_string(f"{scheme}://127.0.0.1:{port}")
+            limiter = FixedWindowRateLimiter(storage)
+            start = time.perf_counter()
+            allowed = sum(limiter.hit(item, scheme, "bench") for _ in range(hits))
+            elapsed = time.perf_counter() - start
+            calls = getattr(storage, "backend_calls", hits)
+            print(f"{limit:16} {scheme:14} {hits / elapsed:10.0f} hits/s  {calls:6d} backend calls  {allowed} allowed")
@@ -0,0 +1,45 @@
+"""Micro-benchmark: compiled therapy keyword matcher vs. the old per-keyword substring scan.
+
+Usage: python bench/bench_therapy_filter.py [iterations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from therapy_filter import THERAPY_KEYWORDS, is_therapy_related
+
+MESSAGES = [
+    "I feel anxious and overwhelmed at work, what can I do?",
+    "What is the capital of France?",
+    "My relationship ended last week and I can't stop thinking about it.",
+    "Can you recommend a good pasta recipe for dinner tonight?",
+    "Give me a banana bread recipe with no eggs.",
+    "I have been having nightmares and trouble sleeping since the accident.",
+    "Explain the rules of cricket in detail please, including how scoring works across innings.",
+]
+
+
+def legacy_is_therapy_related(message):
+    message_lower = message.lower()
+    return any(keyword in message_lower for keyword in list(THERAPY_KEYWORDS))
+
+
+def run(fn, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for message in MESSAGES:
+            fn(message)
+    elapsed = time.perf_counter() - start
+    return iterations * len(MESSAGES) / elapsed
+
+
+if __name__ == "__main__":
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    legacy = run(legacy_is_therapy_related, iterations)
+    compiled = run(is_therapy_related, iterations)
+    print(f"legacy substring scan: {legacy:12,.0f} messages/s")
+    print(f"compiled matcher:      {compiled:12,.0f} messages/s ({compiled / legacy:.1f}x)")
+    for message in MESSAGES:
+        print(f"  legacy={legacy_is_therapy_related(message)!s:5} compiled={is_therapy_related(message)!s:5} {message}")
@@ -0,0 +1,266 @@
+"""Load test: replays history.json-shaped traffic against the app and reports latency per endpoint.
+
+Each virtual user signs up, logs in, creates the sessions of one fixture user,
+sends its messages to /chat (or /chat/stream) and finally reads /history.
+
+By default the app is started as a subprocess in a scratch directory, pointed at
+the local mock xAI and translator servers from bench/mock_servers.py, with rate
+limiting off. --redis-standin turns rate limiting on with generous limits, counted in
+a local Redis stand-in, to measure the shared-storage path. --gevent serves the app
+through serve.py instead of the threaded development server. Pass --base-url to drive
+an app that is already running instead.
+
+Usage: python bench/loadtest.py [--users 20] [--concurrency 10] [--iterations 1]
+           [--fixture bench/fixtures/loadtest_history.json] [--stream] [--redis-standin] [--gevent]
+           [--base-url http://127.0.0.1:5001] [--json report.json]
+           [--max-p95-ms 2000] [--max-error-rate 0.01]
+           [mock server options, see bench/mock_servers.py]
+
+Exits non-zero when a --max-* threshold is exceeded, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "bench"))
+
+from mock_servers import add_mock_arguments, start_mocks
+from redis_standin import start_redis_standin
+
+DEFAULT_FIXTURE = os.path.join(ROOT, "bench", "fixtures", "loadtest_history.json")
+PASSWORD = "load-test-password"
+
+
+def load_fixture(path):
+    # Same layouts the app's history migration accepts: session lists or flat message lists
+    with open(path, encoding="utf-8") as f:
+        history = json.load(f)
+    users = []
+    for entries in history.values():
+        sessions = []
+        flat = []
+        for entry in entries or []:
+            if "messages" in entry or "title" in entry:
+                sessions.append((entry.get("title") or "Untitled Session",
+                                 [m["user"] for m in entry.get("messages", []) if m.get("user")]))
+            elif entry.get("user"):
+                flat.append(entry["user"])
+        if flat:
+            sessions.insert(0, ("Untitled Session", flat))
+        if sessions:
+            users.append(sessions)
+    if not users:
+        raise SystemExit(f"{path} contains no messages")
+    return users
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)  # endpoint -> [(seconds, ok)]
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, seconds, ok):
+        with self._lock:
+            self.samples[endpoint].append((seconds, ok))
+
+
+def percentile(sorted_values, fraction):
+    # Nearest-rank percentile
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(fraction * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def call(http, recorder, endpoint, method, url, **kwargs):
+    start = time.perf_counter()
+    try:
+        response = http.request(method, url, timeout=120, **kwargs)
+        if kwargs.get("stream"):
+            # Time to the end of the event stream, not to the first byte
+            for _ in response.iter_content(chunk_size=None):
+                pass
+        ok = response.status_code < 400
+    except requests.RequestException:
+        response, ok = None, False
+    recorder.record(endpoint, time.perf_counter() - start, ok)
+    return response
+
+
+def virtual_user(base_url, sessions, user_number, run_id, recorder, stream):
+    http = requests.Session()
+    credentials = {"username": f"load_{run_id}_{user_number}", "password": PASSWORD}
+    call(http, recorder, "/signup", "POST", f"{base_url}/signup", json=credentials)
+    login = call(http, recorder, "/login", "POST", f"{base_url}/login", json=credentials)
+    if login is None or login.status_code != 200:
+        return
+    chat_endpoint = "/chat/stream" if stream else "/chat"
+    for title, messages in sessions:
+        created = call(http, recorder, "/create_session", "POST", f"{base_url}/create_session",
+                       json={"session_title": title})
+        if created is None or created.status_code != 200:
+            continue
+        session_id = created.json().get("session_id")
+        for message in messages:
+            call(http, recorder, chat_endpoint, "POST", f"{base_url}{chat_endpoint}",
+                 json={"message": message, "session_id": session_id, "model": "grok-2"}, stream=stream)
+    call(http, recorder, "/history", "GET", f"{base_url}/history")
+
+
+def run_load(base_url, fixture_users, total_users, concurrency, stream):
+    recorder = Recorder()
+    run_id = uuid.uuid4().hex[:8]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(virtual_user, base_url, fixture_users[i % len(fixture_users)], i, run_id, recorder, stream)
+            for i in range(total_users)
+        ]
+        for future in futures:
+            future.result()
+    return recorder, time.perf_counter() - start
+
+
+def summarize(recorder, wall_seconds):
+    report = {}
+    for endpoint, samples in sorted(recorder.samples.items()):
+        latencies = sorted(seconds * 1000 for seconds, _ in samples)
+        errors = sum(1 for _, ok in samples if not ok)
+        report[endpoint] = {
+            "requests": len(samples),
+            "errors": errors,
+            "error_rate": errors / len(samples),
+            "rps": len(samples) / wall_seconds,
+            "p50_ms": percentile(latencies, 0.50),
+            "p95_ms": percentile(latencies, 0.95),
+            "p99_ms": percentile(latencies, 0.99),
+        }
+    return report
+
+
+def print_report(report, wall_seconds):
+    print(f"{'endpoint':16} {'requests':>8} {'errors':>7} {'rps':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for endpoint, row in report.items():
+        print(f"{endpoint:16} {row['requests']:8d} {row['errors']:7d} {row['rps']:8.1f} "
+              f"{row['p50_ms']:9.1f} {row['p95_ms']:9.1f} {row['p99_ms']:9.1f}")
+    print(f"wall time {wall_seconds:.1f}s")
+
+
+def wait_until_up(base_url, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"app exited with status {process.returncode}")
+        try:
+            requests.get(f"{base_url}/models", timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise SystemExit(f"app did not start within {timeout}s")
+
+
+def start_app(args, workdir):
+    xai, translator = start_mocks(args)
+    port = args.app_port
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        FLASK_SECRET_KEY="load-test",
+        XAI_API_KEY="load-test",
+        XAI_API_URL=f"http://127.0.0.1:{xai.server_port}/v1/chat/completions",
+        TRANSLATOR_URL=f"http://127.0.0.1:{translator.server_port}",
+        HISTORY_DB=os.path.join(workdir, "history.db"),
+        TRANSLATION_CACHE_DB=os.path.join(workdir, "translations.db"),
+    )
+    if args.redis_standin:
+        redis = start_redis_standin()
+        env.update(
+            RATELIMIT_STORAGE_URI=f"{args.ratelimit_scheme}://127.0.0.1:{redis.server_address[1]}",
+            DEFAULT_RATE_LIMITS="100000 per hour",
+            CHAT_RATE_LIMIT="100000 per hour",
+            SIGNUP_RATE_LIMIT="100000 per hour",
+            LOGIN_RATE_LIMIT="100000 per hour",
+            SESSION_RATE_LIMIT="100000 per hour",
+        )
+    else:
+        env["RATELIMIT_ENABLED"] = "0"
+    # A scratch working directory keeps users.json and the databases out of the checkout
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "serve.py" if args.gevent else "app.py")], cwd=workdir, env=env,
+        stdout=subprocess.DEVNULL if not args.app_logs else None,
+        stderr=subprocess.DEVNULL if not args.app_logs else None,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    wait_until_up(base_url, process)
+    return base_url, process
+
+
+def check_thresholds(report, args):
+    failures = []
+    for endpoint, row in report.items():
+        if args.max_p95_ms is not None and row["p95_ms"] > args.max_p95_ms:
+            failures.append(f"{endpoint} p95 {row['p95_ms']:.1f}ms > {args.max_p95_ms}ms")
+        if args.max_error_rate is not None and row["error_rate"] > args.max_error_rate:
+            failures.append(f"{endpoint} error rate {row['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--users", type=int, default=20, help="virtual users per iteration")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=1)
+    parser.add_argument("--fixture", default=DEFAULT_FIXTURE)
+    parser.add_argument("--stream", action="store_true", help="send messages to /chat/stream")
+    parser.add_argument("--redis-standin", action="store_true", help="rate limit through a local Redis stand-in")
+    parser.add_argument("--ratelimit-scheme", default="leased+redis", help="redis or leased+redis")
+    parser.add_argument("--gevent", action="store_true", help="serve the app through serve.py")
+    parser.add_argument("--base-url", help="drive an already running app instead of starting one")
+    parser.add_argument("--app-port", type=int, default=5099)
+    parser.add_argument("--app-logs", action="store_true", help="show the app's output")
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--max-p95-ms", type=float)
+    parser.add_argument("--max-error-rate", type=float)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    fixture_users = load_fixture(args.fixture)
+    process = None
+    with tempfile.TemporaryDirectory() as workdir:
+        try:
+            if args.base_url:
+                base_url = args.base_url.rstrip("/")
+            else:
+                base_url, process = start_app(args, workdir)
+            recorder = Recorder()
+            wall_seconds = 0.0
+            for _ in range(args.iterations):
+                iteration, seconds = run_load(base_url, fixture_users, args.users, args.concurrency, args.stream)
+                for endpoint, samples in iteration.samples.items():
+                    recorder.samples[endpoint].extend(samples)
+                wall_seconds += seconds
+        finally:
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    report = summarize(recorder, wall_seconds)
+    print_report(report, wall_seconds)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"wall_seconds": wall_seconds, "endpoints": report}, f, indent=2)
+    failures = check_thresholds(report, args)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,213 @@
+"""Local stand-ins for the xAI completion API and the translator, for load tests.
+
+Both servers take the same knobs: a base latency with jitter and an error rate.
+The completion mock speaks the OpenAI-compatible /v1/chat/completions protocol,
+including SSE streaming; the translator mock speaks LibreTranslate's POST /translate,
+which the app uses when TRANSLATOR_URL is set. Into English it translates from a
+lookup table of the fixture messages (bench/fixtures/loadtest_translations.json),
+so off-topic messages in any language still hit the therapy filter's rejection.
+
+Usage: python bench/mock_servers.py [--xai-port 8081] [--translator-port 8082]
+           [--latency-ms 300] [--jitter-ms 100] [--error-rate 0.01]
+           [--chunk-delay-ms 20] [--translator-latency-ms 80] [--translations FILE]
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPLY_TEMPLATE = """Thank you for sharing that. Here are a few things that may help:
+
+**Name the feeling**
+Write down what you feel and when it started.
+
+**Slow your breathing**
+Breathe in for four counts and out for six, five times.
+
+**Reach out**
+Talk to someone you trust about "{topic}".
+
+Take it one step at a time."""
+
+DEFAULT_TRANSLATIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures",
+                                    "loadtest_translations.json")
+
+# Status codes an upstream failure is drawn from; 429 and 503 exercise the app's retries
+ERROR_STATUSES = [429, 500, 503]
+
+
+class MockConfig:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, chunk_delay_ms=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.chunk_delay_ms = chunk_delay_ms
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def begin(self):
+        # Sleeps for the configured latency; returns an error status to send, or None
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        failed = random.random() < self.error_rate
+        with self._lock:
+            self.requests += 1
+            self.errors += failed
+        return random.choice(ERROR_STATUSES) if failed else None
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real providers
+    config = MockConfig()
+
+    def read_json(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            return json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            return {}
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle(self):
+        try:
+            super().handle()
+        except ConnectionError:
+            pass  # The client went away, e.g. the app under test exited
+
+    def log_message(self, *args):
+        pass
+
+
+class MockCompletionHandler(MockHandler):
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self.send_json(404, {"error": "Not found"})
+            return
+        payload = self.read_json()
+        status = self.config.begin()
+        if status is not None:
+            self.send_json(status, {"error": {"message": "Mock upstream failure"}})
+            return
+        messages = payload.get("messages") or [{}]
+        topic = str(messages[-1].get("content", ""))[:60]
+        reply = REPLY_TEMPLATE.format(topic=topic)
+        if payload.get("stream"):
+            self.stream_reply(payload.get("model"), reply)
+        else:
+            self.send_json(200, {
+                "model": payload.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+            })
+
+    def stream_reply(self, model, reply):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # Word-sized deltas, like a real token stream
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            delta = word if i == len(words) - 1 else word + " "
+            chunk = {"model": model, "choices": [{"index": 0, "delta": {"content": delta}}]}
+            self.write_chunk(f"data: {json.dumps(chunk)}\n\n")
+            if self.config.chunk_delay_ms:
+                time.sleep(self.config.chunk_delay_ms / 1000)
+        self.write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockTranslatorHandler(MockHandler):
+    translations = {}  # Fixture message -> English
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/translate":
+            self.send_json(404, {"error": "Not found"})
+            return
+        payload = self.read_json()
+        status = self.config.begin()
+        if status is not None:
+            self.send_json(status, {"error": "Mock translator failure"})
+            return
+        target = payload.get("target", "en")
+        text = str(payload.get("q", ""))
+        if target == "en" and text.strip() in self.translations:
+            self.send_json(200, {"translatedText": self.translations[text.strip()]})
+            return
+        # Anything else is tagged line by line, so translated output is recognisable but
+        # keeps the line structure (and batch sentinels) intact
+        translated = "\n".join(
+            f"[{target}] {line}" if line.strip() and line.strip() != "@@@" else line for line in text.split("\n")
+        )
+        self.send_json(200, {"translatedText": translated})
+
+
+class MockServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections in a burst, and each dropped
+    # SYN costs the client a 1 s retransmit that would show up as upstream latency
+    request_queue_size = 1024
+
+
+def start_server(handler_cls, config, port=0, host="127.0.0.1", **attributes):
+    # Each server gets its own handler subclass so the two configs stay independent
+    handler = type(handler_cls.__name__, (handler_cls,), {"config": config, **attributes})
+    server = MockServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_mock_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=300, help="completion latency")
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of completions that fail")
+    parser.add_argument("--chunk-delay-ms", type=float, default=20, help="delay between streamed deltas")
+    parser.add_argument("--translator-latency-ms", type=float, default=80)
+    parser.add_argument("--translator-jitter-ms", type=float, default=30)
+    parser.add_argument("--translator-error-rate", type=float, default=0.0)
+    parser.add_argument("--translations", default=DEFAULT_TRANSLATIONS,
+                        help="JSON object mapping fixture messages to their English translation")
+
+
+def start_mocks(args, xai_port=0, translator_port=0):
+    # Returns (xai server, translator server)
+    xai = start_server(MockCompletionHandler, MockConfig(
+        args.latency_ms, args.jitter_ms, args.error_rate, args.chunk_delay_ms), xai_port)
+    with open(args.translations, encoding="utf-8") as f:
+        translations = json.load(f)
+    translator = start_server(MockTranslatorHandler, MockConfig(
+        args.translator_latency_ms, args.translator_jitter_ms, args.translator_error_rate), translator_port,
+        translations=translations)
+    return xai, translator
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--xai-port", type=int, default=8081)
+    parser.add_argument("--translator-port", type=int, default=8082)
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+    xai, translator = start_mocks(args, args.xai_port, args.translator_port)
+    print(f"XAI_API_URL=http://127.0.0.1:{xai.server_port}/v1/chat/completions")
+    print(f"TRANSLATOR_URL=http://127.0.0.1:{translator.server_port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,202 @@
+"""In-process Redis stand-in speaking RESP, for exercising shared rate-limit storage without a Redis server.
+
+Covers the commands the limits library's Redis storage issues for fixed-window
+limits: plain key/counter commands plus its incr-expire Lua script, which is run
+natively once recognised. Other scripts are refused with an error. State is
+held per process, shared by every stand-in started in it.
+
+Usage: python bench/redis_standin.py [port]
+"""
+import hashlib
+import socketserver
+import sys
+import threading
+import time
+
+_lock = threading.Lock()
+_data = {}     # key -> bytes
+_expiry = {}   # key -> monotonic deadline
+_scripts = {}  # sha1 hex -> script source
+
+
+class CommandError(Exception):
+    pass
+
+
+def _alive(key):
+    # Caller holds the lock
+    deadline = _expiry.get(key)
+    if deadline is not None and deadline <= time.monotonic():
+        _data.pop(key, None)
+        _expiry.pop(key, None)
+    return key in _data
+
+
+def _incrby(key, amount):
+    current = int(_data[key]) if _alive(key) else 0
+    current += amount
+    _data[key] = str(current).encode()
+    return current
+
+
+def _ttl(key, scale):
+    if not _alive(key):
+        return -2
+    deadline = _expiry.get(key)
+    if deadline is None:
+        return -1
+    return int((deadline - time.monotonic()) * scale)
+
+
+def _run_script(source, keys, args):
+    # limits' incr_expire.lua: INCRBY, and set the TTL when the key was just created
+    if 'redis.call("incrby"' in source and '"expire"' in source:
+        amount = int(args[1])
+        current = _incrby(keys[0], amount)
+        if current == amount:
+            _expiry[keys[0]] = time.monotonic() + int(args[0])
+        return current
+    raise CommandError("ERR script not supported by the stand-in")
+
+
+def execute(command, args):
+    name = command.upper()
+    with _lock:
+        if name == b"PING":
+            return "PONG"
+        if name in (b"CLIENT", b"SELECT"):
+            return "OK"
+        if name == b"GET":
+            return _data[args[0]] if _alive(args[0]) else None
+        if name == b"SET":
+            key, value = args[0], args[1]
+            options = [a.upper() for a in args[2:]]
+            if b"NX" in options and _alive(key):
+                return None
+            _data[key] = value
+            _expiry.pop(key, None)
+            for option in (b"EX", b"PX"):
+                if option in options:
+                    ttl = int(args[2 + options.index(option) + 1])
+                    _expiry[key] = time.monotonic() + (ttl if option == b"EX" else ttl / 1000)
+            return "OK"
+        if name == b"DEL":
+            removed = sum(1 for key in args if _alive(key))
+            for key in args:
+                _data.pop(key, None)
+                _expiry.pop(key, None)
+            return removed
+        if name == b"EXISTS":
+            return sum(1 for key in args if _alive(key))
+        if name in (b"INCR", b"INCRBY"):
+            return _incrby(args[0], int(args[1]) if name == b"INCRBY" else 1)
+        if name in (b"EXPIRE", b"PEXPIRE"):
+            if not _alive(args[0]):
+                return 0
+            ttl = int(args[1])
+            _expiry[args[0]] = time.monotonic() + (ttl if name == b"EXPIRE" else ttl / 1000)
+            return 1
+        if name == b"TTL":
+            return _ttl(args[0], 1)
+        if name == b"PTTL":
+            return _ttl(args[0], 1000)
+        if name in (b"FLUSHALL", b"FLUSHDB"):
+            _data.clear()
+            _expiry.clear()
+            return "OK"
+        if name == b"SCRIPT":
+            sub = args[0].upper()
+            if sub == b"LOAD":
+                sha = hashlib.sha1(args[1]).hexdigest()
+                _scripts[sha] = args[1].decode()
+                return sha.encode()
+            if sub == b"EXISTS":
+                return [int(sha.decode() in _scripts) for sha in args[1:]]
+            if sub == b"FLUSH":
+                _scripts.clear()
+                return "OK"
+        if name in (b"EVAL", b"EVALSHA"):
+            if name == b"EVAL":
+                source = args[0].decode()
+            else:
+                source = _scripts.get(args[0].decode())
+                if source is None:
+                    raise CommandError("NOSCRIPT No matching script. Please use EVAL.")
+            numkeys = int(args[1])
+            return _run_script(source, args[2:2 + numkeys], args[2 + numkeys:])
+    raise CommandError(f"ERR unknown command '{command.decode(errors='replace')}'")
+
+
+def encode(value, protocol=2):
+    if value is None:
+        return b"_\r\n" if protocol == 3 else b"$-1\r\n"
+    if isinstance(value, str):
+        return f"+{value}\r\n".encode()
+    if isinstance(value, int):
+        return f":{value}\r\n".encode()
+    if isinstance(value, bytes):
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+    if isinstance(value, list):
+        return b"*%d\r\n" % len(value) + b"".join(encode(v, protocol) for v in value)
+    if isinstance(value, dict):
+        if protocol == 3:
+            return b"%%%d\r\n" % len(value) + b"".join(
+                encode(k, protocol) + encode(v, protocol) for k, v in value.items())
+        return encode([item for pair in value.items() for item in pair], protocol)
+    raise TypeError(type(value))
+
+
+class RespHandler(socketserver.StreamRequestHandler):
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            return line.split()  # Inline command, e.g. from telnet
+        parts = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            parts.append(self.rfile.read(length + 2)[:-2])
+        return parts
+
+    def handle(self):
+        protocol = 2
+        while True:
+            parts = self.read_command()
+            if parts is None:
+                return
+            if not parts:
+                continue
+            if parts[0].upper() == b"HELLO":
+                # redis-py negotiates RESP3 by default; both versions are understood
+                protocol = int(parts[1]) if len(parts) > 1 else protocol
+                hello = {b"server": b"redis", b"version": b"7.0.0", b"proto": protocol, b"mode": b"standalone"}
+                self.wfile.write(encode(hello, protocol))
+                continue
+            try:
+                reply = encode(execute(parts[0], parts[1:]), protocol)
+            except (CommandError, ValueError, IndexError) as e:
+                reply = f"-{e}\r\n".encode() if isinstance(e, CommandError) else b"-ERR syntax error\r\n"
+            self.wfile.write(reply)
+
+
+class RedisStandin(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+def start_redis_standin(port=0, host="127.0.0.1"):
+    server = RedisStandin((host, port), RespHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 6379
+    server = start_redis_standin(port)
+    print(f"RATELIMIT_STORAGE_URI=leased+redis://127.0.0.1:{server.server_address[1]}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
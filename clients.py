@@ -0,0 +1,116 @@
+import os
+import threading
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from deep_translator import GoogleTranslator
+from deep_translator.exceptions import RequestError, TooManyRequests, TranslationNotFound
+from deep_translator.validate import is_empty, is_input_valid, request_failed
+try:
+    from googletrans import Translator
+except ImportError:
+    Translator = None
+
+# Optional LibreTranslate-compatible endpoint used instead of Google Translate (self-hosting, load tests)
+TRANSLATOR_URL = os.getenv("TRANSLATOR_URL")
+
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", 20))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", 60))
+
+# (connect, read) timeout applied to every upstream call so a stalled provider can't pin a worker
+HTTP_TIMEOUT = (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)
+
+
+def build_http_session(pool_size=HTTP_POOL_SIZE):
+    # Keep-alive connection pool; requests speaks HTTP/1.1 only
+    http = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    http.mount("https://", adapter)
+    http.mount("http://", adapter)
+    return http
+
+
+# Shared by every request thread; requests.Session is safe to use concurrently for plain requests
+http_session = build_http_session()
+
+
+class HttpTranslator:
+    """Translator backed by a LibreTranslate-compatible POST /translate endpoint."""
+
+    def __init__(self, base_url, source, target):
+        self.url = base_url.rstrip("/") + "/translate"
+        self.source = source
+        self.target = target
+
+    def translate(self, text):
+        response = http_session.post(
+            self.url,
+            json={"q": text, "source": self.source, "target": self.target, "format": "text"},
+            timeout=HTTP_TIMEOUT,
+        )
+        response.raise_for_status()
+        return response.json()["translatedText"]
+
+
+class PooledGoogleTranslator(GoogleTranslator):
+    """deep-translator's GoogleTranslator, fetching through http_session with HTTP_TIMEOUT.
+
+    The stock translate() calls module-level requests.get with no timeout, so one
+    stalled response pinned the calling worker and every call opened a new connection.
+    """
+
+    def translate(self, text, **kwargs):
+        if not is_input_valid(text, max_chars=5000):
+            return None
+        text = text.strip()
+        if self._same_source_target() or is_empty(text):
+            return text
+        params = dict(self._url_params, tl=self._target, sl=self._source)
+        params[self.payload_key] = text
+        response = http_session.get(self._base_url, params=params, proxies=self.proxies, timeout=HTTP_TIMEOUT)
+        if response.status_code == 429:
+            raise TooManyRequests()
+        if request_failed(status_code=response.status_code):
+            raise RequestError()
+        soup = BeautifulSoup(response.text, "html.parser")
+        element = soup.find(self._element_tag, self._element_query) or \
+            soup.find(self._element_tag, self._alt_element_query)
+        if not element:
+            raise TranslationNotFound(text)
+        return element.get_text(strip=True)
+
+
+# Translators are created once per language pair and shared by every thread: the
+# instances here keep no per-call state and send through the shared session
+_translators = {}
+_translators_lock = threading.Lock()
+
+
+def get_translator(source, target):
+    translator = _translators.get((source, target))
+    if translator is None:
+        if TRANSLATOR_URL:
+            translator = HttpTranslator(TRANSLATOR_URL, source, target)
+        else:
+            translator = PooledGoogleTranslator(source=source, target=target)
+        with _translators_lock:
+            translator = _translators.setdefault((source, target), translator)
+    return translator
+
+
+_googletrans = None
+
+
+def get_googletrans():
+    # googletrans keeps its own keep-alive client (httpx, thread-safe), so one instance reuses connections
+    global _googletrans
+    if Translator is None or TRANSLATOR_URL:
+        # A configured translator endpoint replaces Google entirely, fallback included
+        return None
+    if _googletrans is None:
+        with _translators_lock:
+            if _googletrans is None:
+                _googletrans = Translator(timeout=HTTP_READ_TIMEOUT)
+    return _googletrans
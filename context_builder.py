@@ -0,0 +1,106 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+# Token budget for prior turns and summary, on top of the system prompt and the new message
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", 2000))
+# Most recent turns considered for the verbatim window
+CONTEXT_MAX_TURNS = int(os.getenv("CONTEXT_MAX_TURNS", 20))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", 300))
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", 10000))
+# Per-turn cap for a user message inside the summary
+SUMMARY_POINT_CHARS = 160
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text):
+    # About four characters per token for English; close enough for budgeting without a tokenizer
+    return (len(text) + 3) // 4 + 1 if text else 0
+
+
+def summary_point(turn):
+    # First sentence of what the user said, which carries most of the context in this app
+    text = (turn.get("user_en") or turn.get("user") or "").strip().replace("\n", " ")
+    first = SENTENCE_END.split(text, 1)[0]
+    if len(first) > SUMMARY_POINT_CHARS:
+        first = first[:SUMMARY_POINT_CHARS].rsplit(" ", 1)[0] + "..."
+    return f"- {first}" if first else ""
+
+
+class ContextBuilder:
+    """Assembles prior turns of a session into a bounded prompt.
+
+    The newest turns are included verbatim until the token budget runs out.
+    Turns that fall out of that window are folded into an extractive rolling
+    summary, which is cached per session and only extended with the turns that
+    dropped out since the last call.
+    """
+
+    def __init__(self, store, token_budget=CONTEXT_TOKEN_BUDGET, max_turns=CONTEXT_MAX_TURNS,
+                 summary_budget=SUMMARY_TOKEN_BUDGET, cache_size=SUMMARY_CACHE_SIZE):
+        self.store = store
+        self.token_budget = token_budget
+        self.max_turns = max_turns
+        self.summary_budget = summary_budget
+        self.cache_size = cache_size
+        self._summaries = OrderedDict()  # session key -> (last summarized message ID, summary lines)
+        self._lock = threading.Lock()
+
+    def _summary(self, username, session_id, window_start_id):
+        # Summary of every message older than window_start_id
+        key = (username, session_id)
+        with self._lock:
+            covered_id, lines = self._summaries.get(key, (0, []))
+        if covered_id < window_start_id - 1:
+            dropped, _ = self.store.get_messages(
+                username, session_id, after=covered_id, before=window_start_id,
+                limit=window_start_id, include_english=True,
+            )
+            lines = list(lines)
+            for turn in dropped or []:
+                point = summary_point(turn)
+                if point:
+                    lines.append(point)
+                covered_id = turn["id"]
+            # Rolling: the oldest points go first once the summary is over budget
+            while lines and sum(estimate_tokens(line) for line in lines) > self.summary_budget:
+                lines.pop(0)
+            with self._lock:
+                self._summaries[key] = (covered_id, lines)
+                self._summaries.move_to_end(key)
+                while len(self._summaries) > self.cache_size:
+                    self._summaries.popitem(last=False)
+        return lines
+
+    def build(self, username, session_id):
+        """Returns chat messages (role/content dicts) to put between the system prompt and the new message."""
+        turns, _ = self.store.get_messages(username, session_id, limit=self.max_turns, include_english=True)
+        if not turns:
+            return []
+        window = []
+        used = 0
+        for turn in reversed(turns):
+            user_text = turn.get("user_en") or turn.get("user") or ""
+            reply_text = turn.get("grok_en") or turn.get("grok") or ""
+            cost = estimate_tokens(user_text) + estimate_tokens(reply_text)
+            if used + cost > self.token_budget:
+                break
+            used += cost
+            window.append((turn["id"], user_text, reply_text))
+        window.reverse()
+
+        messages = []
+        window_start_id = window[0][0] if window else turns[-1]["id"] + 1
+        if window_start_id > turns[0]["id"] or len(turns) == self.max_turns:
+            lines = self._summary(username, session_id, window_start_id)
+            if lines:
+                messages.append({
+                    "role": "system",
+                    "content": "Summary of earlier messages from the user in this session:\n" + "\n".join(lines),
+                })
+        for _, user_text, reply_text in window:
+            messages.append({"role": "user", "content": user_text})
+            messages.append({"role": "assistant", "content": reply_text})
+        return messages
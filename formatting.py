@@ -0,0 +1,55 @@
+import re
+
+# A step heading is "**Title**..." or "1. Title"; bold wins when a line is both
+STEP_PATTERN = re.compile(r"\*\*(.+?)\*\*|(\d+)\.\s*(.+)")
+DESCRIPTION_INDENT = "   "
+
+
+class ResponseFormatter:
+    """Incremental reply formatter: feed() text as it arrives, get back finished lines.
+
+    Step headings are renumbered in order, lines after the first step are indented as
+    descriptions, and blank lines are kept. Each input line maps to exactly one output
+    line as soon as its newline arrives; the final line is emitted by close(). Joining
+    everything feed() and close() return with "\\n" gives format_api_response(text).
+    """
+
+    def __init__(self):
+        self._partial = []  # Pieces of the current, unterminated line
+        self._in_list = False
+        self._steps = 0
+
+    def _format_line(self, line):
+        line = line.strip()
+        if not line:
+            return ""
+        match = STEP_PATTERN.match(line)
+        if match:
+            self._in_list = True
+            self._steps += 1
+            title = match.group(1) if match.group(1) is not None else match.group(3)
+            return f"{self._steps}. {title.strip()}"
+        if self._in_list:
+            return DESCRIPTION_INDENT + line
+        return line
+
+    def feed(self, chunk):
+        if "\n" not in chunk:
+            self._partial.append(chunk)
+            return []
+        self._partial.append(chunk)
+        lines = "".join(self._partial).split("\n")
+        self._partial = [lines.pop()]
+        return [self._format_line(line) for line in lines]
+
+    def close(self):
+        line = "".join(self._partial)
+        self._partial = []
+        return [self._format_line(line)]
+
+
+def format_api_response(response_text):
+    formatter = ResponseFormatter()
+    lines = formatter.feed(response_text)
+    lines.extend(formatter.close())
+    return "\n".join(lines)
@@ -0,0 +1,245 @@
+import json
+import logging
+import math
+import os
+import threading
+import unicodedata
+from collections import Counter, OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Results below this confidence defer to the language already established for the session
+LANGID_MIN_CONFIDENCE = float(os.getenv("LANGID_MIN_CONFIDENCE", 0.9))
+# Texts with fewer letters than this are too short for n-gram statistics on their own
+LANGID_SHORT_TEXT = int(os.getenv("LANGID_SHORT_TEXT", 12))
+LANGID_SESSION_CACHE_SIZE = int(os.getenv("LANGID_SESSION_CACHE_SIZE", 10000))
+# Comma-separated profile names to consider (e.g. "en,de,fr,es"); empty means every profile
+LANGID_LANGUAGES = [lang for lang in os.getenv("LANGID_LANGUAGES", "").split(",") if lang]
+# Non-English results from fewer n-grams than this fall back to English
+LANGID_MIN_NGRAMS = int(os.getenv("LANGID_MIN_NGRAMS", 20))
+# Prior log-odds in favour of English, which most users write in
+LANGID_DEFAULT_PRIOR = float(os.getenv("LANGID_DEFAULT_PRIOR", 2))
+# Latin-script text whose words are mostly common English words is English without scoring
+LANGID_ENGLISH_SHARE = float(os.getenv("LANGID_ENGLISH_SHARE", 0.5))
+DEFAULT_LANGUAGE = "en"
+# Probability mass given to an n-gram a profile has never seen (langdetect's alpha / base frequency)
+LANGID_SMOOTHING = 0.5 / 10000
+
+# Common English words, and words typical of how people open a therapy conversation.
+# Words that are also common in other Latin-script languages ("me", "no", "die", "so",
+# "in", "is", "on", ...) are left out so they can't tip a foreign message to English.
+ENGLISH_WORDS = frozenset("""
+i i'm im i've ive i'll i'd my me myself mine you your you're we our us they them their he she his her it it's its
+am are were be been being have has had does did don't doesn't didn't can can't cannot could couldn't would
+wouldn't should shouldn't will won't just not never always really very too about with without for from of at by
+the and but or if because when what why how who where which that this these those there here than then
+feel feeling feels felt think thought know knew want wanted need needed get getting got keep keeps try trying
+help hi hello hey please thanks thank talk talking tell told say said going go went make made take
+sad sadness happy angry anger anxious anxiety anxiousness stress stressed stressful depressed depression lonely alone
+tired exhausted scared afraid fear fears worried worry worrying nervous panic attack attacks hopeless helpless
+hurt hurts pain cry crying cried upset overwhelmed numb empty worthless guilty ashamed shame sleep sleeping
+can't sleepless insomnia nightmares grief grieving died dead death passed lost loss hate hating love
+mom mum dad mother father parents brother sister friend friends boyfriend girlfriend husband wife partner
+family kids child children job work boss school life day today tonight lately anymore everything nothing
+anyone someone nobody everybody everyone all some any much many more most other like likes
+""".split())
+
+# Scripts used by a single language are answered without scoring. Scripts shared by
+# several languages narrow the candidates the n-gram model has to score.
+SCRIPT_LANGUAGES = {
+    "HIRAGANA": ["ja"],
+    "KATAKANA": ["ja"],
+    "HANGUL": ["ko"],
+    "GREEK": ["el"],
+    "HEBREW": ["he"],
+    "THAI": ["th"],
+    "GEORGIAN": ["ka"],
+    "ARMENIAN": ["hy"],
+    "GUJARATI": ["gu"],
+    "GURMUKHI": ["pa"],
+    "TAMIL": ["ta"],
+    "TELUGU": ["te"],
+    "KANNADA": ["kn"],
+    "MALAYALAM": ["ml"],
+    "BENGALI": ["bn"],
+    "CJK": ["zh-cn", "zh-tw"],
+    "CYRILLIC": ["ru", "uk", "bg", "mk"],
+    "ARABIC": ["ar", "fa", "ur"],
+    "DEVANAGARI": ["hi", "mr", "ne"],
+}
+# Japanese text mixes kana with CJK ideographs; any kana at all decides it
+SCRIPT_PRIORITY = ["HIRAGANA", "KATAKANA", "HANGUL"]
+# Everything else is written in Latin script
+NON_LATIN_LANGUAGES = frozenset(lang for langs in SCRIPT_LANGUAGES.values() for lang in langs)
+
+
+def char_script(ch):
+    name = unicodedata.name(ch, "")
+    if name.startswith("CJK"):
+        return "CJK"
+    return name.split(" ", 1)[0] if name else ""
+
+
+def english_share(text):
+    # Fraction of the words that are common English words
+    cleaned = "".join(ch if ch.isalpha() or ch == "'" else " " for ch in text.lower().replace("\u2019", "'"))
+    words = [word.strip("'") for word in cleaned.split() if word.strip("'")]
+    if not words:
+        return 0.0
+    return sum(1 for word in words if word in ENGLISH_WORDS) / len(words)
+
+
+def default_profile_dir():
+    # langdetect ships character 1-3 gram frequency profiles; reuse them as the model
+    try:
+        import langdetect
+    except ImportError:
+        return None
+    return os.path.join(os.path.dirname(langdetect.__file__), "profiles")
+
+
+class LanguageIdentifier:
+    """Deterministic language identification.
+
+    Character 1-3 gram log probabilities are precomputed once from the profile
+    directory. Texts written in a script unique to one language skip scoring, and
+    each chat session remembers its established language for short or ambiguous
+    messages.
+
+    Short Latin-script messages carry too few n-grams to tell languages apart ("I am
+    sad" scores as Somali), so English is favoured: mostly-English vocabulary decides
+    it outright, English gets a prior, and a non-English result needs at least
+    LANGID_MIN_NGRAMS n-grams to stand.
+    """
+
+    def __init__(self, profile_dir=None, languages=None, session_cache_size=LANGID_SESSION_CACHE_SIZE):
+        languages = languages or LANGID_LANGUAGES
+        self.languages = []
+        self._deltas = {}   # n-gram -> {language index: log p(n-gram) - log p(unseen n-gram)}
+        self._default_index = None
+        self._session_languages = OrderedDict()
+        self._session_cache_size = session_cache_size
+        self._lock = threading.Lock()
+        profile_dir = profile_dir or os.getenv("LANGID_PROFILES") or default_profile_dir()
+        if profile_dir and os.path.isdir(profile_dir):
+            self._load_profiles(profile_dir, languages)
+        else:
+            logger.warning("No language profiles found, only script detection is available")
+
+    def _load_profiles(self, profile_dir, languages):
+        for name in sorted(os.listdir(profile_dir)):
+            if languages and name not in languages:
+                continue
+            with open(os.path.join(profile_dir, name), encoding="utf-8") as f:
+                profile = json.load(f)
+            index = len(self.languages)
+            self.languages.append(profile["name"])
+            totals = profile["n_words"]
+            for gram, count in profile["freq"].items():
+                n = len(gram)
+                if not 1 <= n <= 3:
+                    continue
+                self._deltas.setdefault(gram, {})[index] = math.log(1 + count / totals[n - 1] / LANGID_SMOOTHING)
+        if DEFAULT_LANGUAGE in self.languages:
+            self._default_index = self.languages.index(DEFAULT_LANGUAGE)
+        logger.info("Loaded %d language profiles from %s", len(self.languages), profile_dir)
+
+    def _script_candidates(self, text):
+        scripts = Counter(char_script(ch) for ch in text if ch.isalpha())
+        if not scripts:
+            return None
+        for script in SCRIPT_PRIORITY:
+            if scripts.get(script):
+                return SCRIPT_LANGUAGES[script]
+        script = scripts.most_common(1)[0][0]
+        return SCRIPT_LANGUAGES.get(script)
+
+    def _score(self, text, candidates=None):
+        # Returns (language, confidence, number of n-grams scored)
+        if not self.languages:
+            # No model: the script still narrows it down to its most common language
+            return (candidates[0], 1 / len(candidates), 0) if candidates else (None, 0.0, 0)
+        allowed = None
+        if candidates:
+            allowed = {i for i, lang in enumerate(self.languages) if lang in candidates}
+            if not allowed:
+                return candidates[0], 1.0, 0
+        # Same n-grams as the profiles: words padded with spaces, non-letters as separators
+        cleaned = "".join(ch if ch.isalpha() else " " for ch in text)
+        counts = Counter()
+        for word in cleaned.split():
+            padded = f" {word} "
+            for n in (1, 2, 3):
+                for start in range(len(padded) - n + 1):
+                    gram = padded[start:start + n]
+                    if gram.strip():
+                        counts[gram] += 1
+        if not counts:
+            return None, 0.0, 0
+        scores = [0.0] * len(self.languages)
+        for gram, count in counts.items():
+            deltas = self._deltas.get(gram)
+            if deltas:
+                for index, delta in deltas.items():
+                    scores[index] += delta * count
+        if self._default_index is not None:
+            scores[self._default_index] += LANGID_DEFAULT_PRIOR
+        indexes = allowed if allowed is not None else range(len(self.languages))
+        best = max(indexes, key=scores.__getitem__)
+        # Summed log-likelihoods make a plain softmax saturate at ~1.0 for any text.
+        # Tempering by sqrt(n-grams) keeps short texts uncertain and lets confidence
+        # grow with the amount of evidence.
+        n_grams = sum(counts.values())
+        temperature = math.sqrt(n_grams)
+        total = sum(math.exp((scores[i] - scores[best]) / temperature) for i in indexes)
+        return self.languages[best], 1 / total, n_grams
+
+    def detect(self, text):
+        """Returns (language code, confidence between 0 and 1)."""
+        return self._detect(text, self._script_candidates(text))
+
+    def _detect(self, text, candidates):
+        if candidates and len(candidates) == 1:
+            return candidates[0], 1.0
+        if candidates is None:
+            # Latin script (or none): check for plain English before scoring
+            share = english_share(text)
+            if share >= LANGID_ENGLISH_SHARE:
+                return DEFAULT_LANGUAGE, share
+        lang, confidence, n_grams = self._score(text, candidates)
+        if lang is None:
+            return DEFAULT_LANGUAGE, 0.0
+        if candidates is None and lang != DEFAULT_LANGUAGE and n_grams < LANGID_MIN_NGRAMS:
+            # Too little text to overrule the default; reported as uncertain so an
+            # established session language still wins
+            return DEFAULT_LANGUAGE, 0.0
+        return lang, confidence
+
+    def detect_for_session(self, text, session_key):
+        # Short or low-confidence messages keep the session's established language, as
+        # long as the message's script allows it: Cyrillic text is never English
+        candidates = self._script_candidates(text)
+        lang, confidence = self._detect(text, candidates)
+        letters = sum(1 for ch in text if ch.isalpha())
+        # Non-Latin scripts are already narrowed down by _script_candidates
+        short = candidates is None and letters < LANGID_SHORT_TEXT
+        with self._lock:
+            established = self._session_languages.get(session_key)
+            if established and not self._script_allows(established, candidates, letters):
+                established = None
+            if established and (confidence < LANGID_MIN_CONFIDENCE or short):
+                self._session_languages.move_to_end(session_key)
+                return established, confidence
+            if confidence >= LANGID_MIN_CONFIDENCE or session_key not in self._session_languages:
+                self._session_languages[session_key] = lang
+                self._session_languages.move_to_end(session_key)
+                while len(self._session_languages) > self._session_cache_size:
+                    self._session_languages.popitem(last=False)
+        return lang, confidence
+
+    @staticmethod
+    def _script_allows(lang, candidates, letters):
+        if candidates is not None:
+            return lang in candidates
+        # Latin text (or no letters at all, e.g. "??" or an emoji)
+        return letters == 0 or lang not in NON_LATIN_LANGUAGES
@@ -0,0 +1,130 @@
+import os
+import threading
+import time
+
+from flask import session
+from flask_limiter.util import get_remote_address
+from limits.storage import Storage, storage_from_string
+
+# Where rate-limit counters live. memory:// is per process; with several workers use a
+# shared backend such as redis://host:6379, or leased+redis://host:6379 to add local leasing.
+RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+# Largest block of hits a worker reserves from the shared counter in one round trip
+RATELIMIT_LEASE_MAX = int(os.getenv("RATELIMIT_LEASE_MAX", 20))
+# Fraction of a limit one worker may hold at a time; small limits fall back to one hit per round trip
+RATELIMIT_LEASE_FRACTION = float(os.getenv("RATELIMIT_LEASE_FRACTION", 0.1))
+
+LEASED_PREFIX = "leased+"
+
+
+def user_or_remote_address():
+    # Logged-in traffic is limited per account, so users behind one proxy or NAT don't share a budget
+    username = session.get("username")
+    if username:
+        return f"user:{username}"
+    return get_remote_address()
+
+
+def limit_amount(key):
+    # limits keys end in "/<amount>/<multiples>/<granularity>"
+    try:
+        return int(key.rsplit("/", 3)[1])
+    except (IndexError, ValueError):
+        return None
+
+
+class _Lease:
+    __slots__ = ("next_count", "last_count", "expires_at")
+
+    def __init__(self, next_count, last_count, expires_at):
+        self.next_count = next_count
+        self.last_count = last_count
+        self.expires_at = expires_at
+
+
+class LeasedStorage(Storage):
+    """Fixed-window counters handed out locally from blocks reserved in a shared backend.
+
+    "leased+redis://host:6379" wraps the storage for "redis://host:6379". A hit that
+    finds no local lease reserves a block of counts with one INCRBY and later hits are
+    numbered from that block in process, so most requests skip the backend round trip.
+    Once a window is over its limit, further hits are refused locally until it resets.
+
+    Counts reserved but not used by one worker are unavailable to the others until the
+    window resets, so a worker never holds more than RATELIMIT_LEASE_FRACTION of a limit.
+    Limits too small for that to allow more than one hit go straight to the backend.
+    """
+
+    STORAGE_SCHEME = [
+        "leased+memory",
+        "leased+redis",
+        "leased+rediss",
+        "leased+redis+unix",
+        "leased+valkey",
+        "leased+memcached",
+    ]
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.backend = storage_from_string(uri[len(LEASED_PREFIX):], **options)
+        self._leases = {}
+        self._lock = threading.Lock()
+        self.backend_calls = 0
+
+    @property
+    def base_exceptions(self):
+        return self.backend.base_exceptions
+
+    def _lease_size(self, key):
+        amount = limit_amount(key)
+        if amount is None:
+            return 1
+        return max(1, min(RATELIMIT_LEASE_MAX, int(amount * RATELIMIT_LEASE_FRACTION)))
+
+    def incr(self, key, expiry, amount=1):
+        lease_size = self._lease_size(key)
+        if lease_size == 1:
+            # Nothing to lease: one round trip per hit, same as the plain storage
+            with self._lock:
+                self.backend_calls += 1
+            return self.backend.incr(key, expiry, amount=amount)
+        now = time.time()
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is not None and lease.expires_at > now:
+                limit = limit_amount(key)
+                if limit is not None and lease.next_count > limit:
+                    # Window already exhausted; no need to ask the backend again
+                    return lease.next_count
+                if lease.next_count + amount - 1 <= lease.last_count:
+                    lease.next_count += amount
+                    return lease.next_count - 1
+        size = max(amount, lease_size)
+        total = self.backend.incr(key, expiry, amount=size)
+        expires_at = self.backend.get_expiry(key)
+        first = total - size + 1
+        with self._lock:
+            self.backend_calls += 2
+            self._leases[key] = _Lease(first + amount, total, expires_at)
+            if len(self._leases) > 10000:
+                self._leases = {k: v for k, v in self._leases.items() if v.expires_at > now}
+        return first + amount - 1
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def get_expiry(self, key):
+        return self.backend.get_expiry(key)
+
+    def check(self):
+        return self.backend.check()
+
+    def reset(self):
+        with self._lock:
+            self._leases.clear()
+        return self.backend.reset()
+
+    def clear(self, key):
+        with self._lock:
+            self._leases.pop(key, None)
+        self.backend.clear(key)
@@ -0,0 +1,95 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", 3600))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 1000))
+# Followers give up on a stuck leader after this long and call upstream themselves
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", 90))
+
+WHITESPACE = re.compile(r"\s+")
+TRAILING_PUNCTUATION = re.compile(r"[\s.!?,;:]+$")
+
+
+def normalize_prompt(message_en):
+    # "I feel anxious." and "i feel  anxious" share a cache entry
+    return TRAILING_PUNCTUATION.sub("", WHITESPACE.sub(" ", message_en.strip().lower()))
+
+
+class ResponseCache:
+    """TTL + LRU cache of formatted English replies."""
+
+    def __init__(self, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, reply, upstream seconds)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        # Returns (reply, seconds the original upstream call took) or None
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < now:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1], entry[2]
+
+    def put(self, key, reply, upstream_seconds):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, reply, upstream_seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.upstream_seconds = 0.0
+
+
+class SingleFlight:
+    """Lets concurrent identical requests share one in-flight upstream call.
+
+    Followers block on the leader's event; each request runs on its own worker thread.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        # Returns (call, is_leader); the leader must call finish() exactly once
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = self._calls[key] = _Call()
+            return call, True
+
+    def finish(self, key, call, result=None, error=None):
+        # Only the first call counts, so a safety-net finish() after the real one is harmless
+        if call.done.is_set():
+            return
+        call.result = result
+        call.error = error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+        call.done.set()
+
+    @staticmethod
+    def wait(call, timeout=SINGLE_FLIGHT_TIMEOUT):
+        # Returns the leader's result, or None if it failed or timed out
+        if not call.done.wait(timeout) or call.error is not None:
+            return None
+        return call.result
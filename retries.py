@@ -0,0 +1,15 @@
+import os
+import random
+import time
+
+RETRY_BACKOFF_BASE = float(os.getenv("RETRY_BACKOFF_BASE", 0.25))
+RETRY_BACKOFF_CAP = float(os.getenv("RETRY_BACKOFF_CAP", 4))
+
+
+def backoff_delay(attempt, base=RETRY_BACKOFF_BASE, cap=RETRY_BACKOFF_CAP):
+    # Exponential backoff with full jitter: attempt 0 waits up to base, attempt 1 up to 2*base, ...
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def sleep_backoff(attempt):
+    time.sleep(backoff_delay(attempt))
@@ -0,0 +1,44 @@
+"""Serves the app on gevent: one greenlet per request instead of one thread.
+
+Monkey patching makes every socket and sleep in the chat pipeline cooperative (xAI,
+the translators, Redis, retry backoff), so a request waiting on an upstream costs a
+greenlet rather than a thread and one process holds hundreds of chats in flight.
+Password hashing runs on native threads (see auth.hash_executor).
+
+Usage: python serve.py
+   or: gunicorn -k gevent --worker-connections 1000 -w 4 app:app
+"""
+from gevent import monkey
+
+monkey.patch_all()
+
+import os  # noqa: E402
+import socket  # noqa: E402
+
+# Every in-flight chat holds a client socket, an upstream connection and a pooled SQLite
+# connection (two files with the WAL), so `ulimit -n` should be about 4x this
+SERVE_MAX_CONNECTIONS = int(os.getenv("SERVE_MAX_CONNECTIONS", 1000))
+# Size the upstream keep-alive pools to match
+os.environ.setdefault("HTTP_POOL_SIZE", str(SERVE_MAX_CONNECTIONS))
+
+from gevent.pool import Pool  # noqa: E402
+from gevent.pywsgi import WSGIHandler, WSGIServer  # noqa: E402
+
+from app import app  # noqa: E402
+
+
+class NoDelayHandler(WSGIHandler):
+    # pywsgi writes headers and body separately; with Nagle on, a keep-alive client's
+    # delayed ACK holds the body back ~40 ms
+    def handle(self):
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().handle()
+
+
+if __name__ == "__main__":
+    port = int(os.getenv("PORT", 5001))
+    # Requests are already logged by tracing.py
+    server = WSGIServer(("0.0.0.0", port), app, spawn=Pool(SERVE_MAX_CONNECTIONS),
+                        handler_class=NoDelayHandler, log=None)
+    app.logger.info("Serving on port %d with gevent, up to %d connections", port, SERVE_MAX_CONNECTIONS)
+    server.serve_forever()
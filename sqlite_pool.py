@@ -0,0 +1,71 @@
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _Lease:
+    # Lives in the borrowing thread's local storage; dropped when that thread exits
+    __slots__ = ("pool", "conn")
+
+    def __init__(self, pool, conn):
+        self.pool = pool
+        self.conn = conn
+
+    def __del__(self):
+        try:
+            self.pool._release(self.conn)
+        except Exception:
+            pass  # Interpreter shutdown
+
+
+class ConnectionPool:
+    """SQLite connections reused across threads.
+
+    A thread borrows a connection on first use and keeps it for its lifetime, so a
+    request sees one connection throughout. When the thread exits the connection
+    goes back to the idle list for the next thread, so servers that start a thread
+    per request reuse a handful of connections instead of opening one each.
+    """
+
+    def __init__(self, path, pragmas=(), row_factory=None):
+        self.path = path
+        self.pragmas = pragmas
+        self.row_factory = row_factory
+        self._idle = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.opened = 0
+
+    def _open(self):
+        # Only one thread uses a connection at a time, but it may change hands
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        if self.row_factory is not None:
+            conn.row_factory = self.row_factory
+        for pragma in self.pragmas:
+            conn.execute(pragma)
+        with self._lock:
+            self.opened += 1
+        return conn
+
+    def connection(self):
+        lease = getattr(self._local, "lease", None)
+        if lease is None:
+            with self._lock:
+                conn = self._idle.pop() if self._idle else None
+            if conn is None:
+                conn = self._open()
+            lease = self._local.lease = _Lease(self, conn)
+        return lease.conn
+
+    def _release(self, conn):
+        if conn.in_transaction:
+            # The thread died mid-transaction; don't hand its locks to the next one
+            conn.rollback()
+        with self._lock:
+            self._idle.append(conn)
+
+    def idle(self):
+        with self._lock:
+            return len(self._idle)
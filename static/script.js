@@ -1,22 +1,25 @@
-let historyData = [];
-let currentSessionIndex = -1;
-let currentSessionTitle = null;
+let historyData = [];  // Session summaries: { id, title, message_count, last_message_id }
+let currentSessionId = null;
 let selectedModel = "grok-2";
+let nextCursor = null;  // Pass as "before" to fetch the page of older messages
+let lastMessageId = null;
+let loadingOlder = false;
+
+async function fetchSessions() {
+    const response = await fetch("/sessions");
+    const data = await response.json();
+    historyData = Array.isArray(data.sessions) ? data.sessions : [];
+}
 
 async function loadHistory() {
     try {
-        const response = await fetch("/history");
-        historyData = await response.json();
-        console.log("Fetched history:", historyData);
-        if (!Array.isArray(historyData)) {
-            historyData = [];
-        }
+        await fetchSessions();
+        console.log("Fetched sessions:", historyData.length);
         displaySessions();
         if (historyData.length > 0) {
-            currentSessionIndex = historyData.length - 1;
-            currentSessionTitle = historyData[currentSessionIndex].title || "Untitled Session";
-            console.log("Loading session on page load:", currentSessionTitle, "at index:", currentSessionIndex);
-            loadSession(currentSessionIndex);
+            const latestSessionId = historyData[historyData.length - 1].id;
+            console.log("Loading session on page load:", latestSessionId);
+            await loadSession(latestSessionId);
         } else {
             console.log("No sessions found, showing create session modal");
             showCreateSessionModal();
@@ -36,39 +39,97 @@ function displaySessions() {
         return;
     }
     sessionList.innerHTML = "";
-    historyData.forEach((session, index) => {
+    historyData.forEach(session => {
         const sessionItem = document.createElement("div");
-        sessionItem.className = `session-item ${index === currentSessionIndex ? "active" : ""}`;
+        sessionItem.className = `session-item ${session.id === currentSessionId ? "active" : ""}`;
         const title = session.title || "Untitled Session";
         sessionItem.textContent = title.length > 30 ? title.substring(0, 30) + "..." : title;
-        sessionItem.onclick = () => loadSession(index);
+        sessionItem.onclick = () => loadSession(session.id);
         sessionList.appendChild(sessionItem);
     });
 }
 
-function loadSession(index) {
-    currentSessionIndex = index;
-    currentSessionTitle = historyData[index].title || "Untitled Session";
-    console.log("Loading session:", currentSessionTitle, "at index:", currentSessionIndex);
+function getChatBox() {
     let chatBox = document.getElementById("chatBox");
     if (!chatBox) {
-        console.error("Chat box element not found in loadSession, creating fallback");
+        console.error("Chat box element not found, creating fallback");
         chatBox = document.createElement("div");
         chatBox.id = "chatBox";
         chatBox.className = "chat-area";
         document.body.appendChild(chatBox);
     }
+    return chatBox;
+}
+
+async function fetchMessages(params) {
+    const query = new URLSearchParams(params);
+    const response = await fetch(`/sessions/${currentSessionId}/messages?${query}`);
+    const data = await response.json();
+    if (!response.ok) {
+        console.error("Error loading messages:", data.error || "Unknown error");
+        return null;
+    }
+    return data;
+}
+
+async function loadSession(sessionId) {
+    currentSessionId = sessionId;
+    console.log("Loading session:", currentSessionId);
+    const chatBox = getChatBox();
     chatBox.innerHTML = "";
-    const session = historyData[index];
-    if (session.messages && Array.isArray(session.messages)) {
-        console.log("Messages in session:", session.messages);
-        session.messages.forEach(msg => {
+    nextCursor = null;
+    lastMessageId = null;
+    displaySessions();
+
+    // Only the newest page is fetched; older pages load when scrolling up
+    try {
+        const data = await fetchMessages({});
+        if (!data || sessionId !== currentSessionId) return;
+        data.messages.forEach(msg => {
             if (msg.user) addMessage("user", msg.user);
             if (msg.grok) addMessage("grok", msg.grok);
         });
-    } else {
-        console.log("No messages found for session:", currentSessionTitle);
+        nextCursor = data.next_cursor;
+        if (data.messages.length > 0) {
+            lastMessageId = data.messages[data.messages.length - 1].id;
+        }
+    } catch (error) {
+        console.error("Error loading session:", error);
+    }
+}
+
+async function loadOlderMessages() {
+    if (!nextCursor || loadingOlder) return;
+    loadingOlder = true;
+    const sessionId = currentSessionId;
+    try {
+        const data = await fetchMessages({ before: nextCursor });
+        if (!data || sessionId !== currentSessionId) return;
+        const chatBox = getChatBox();
+        const previousHeight = chatBox.scrollHeight;
+        const firstChild = chatBox.firstChild;
+        data.messages.forEach(msg => {
+            if (msg.user) chatBox.insertBefore(createMessageElement("user", msg.user), firstChild);
+            if (msg.grok) chatBox.insertBefore(createMessageElement("grok", msg.grok), firstChild);
+        });
+        nextCursor = data.next_cursor;
+        // Keep the message the user was looking at in place
+        chatBox.scrollTop += chatBox.scrollHeight - previousHeight;
+    } catch (error) {
+        console.error("Error loading older messages:", error);
+    } finally {
+        loadingOlder = false;
+    }
+}
+
+// Picks up the IDs of messages saved since the last sync and refreshes the session list counts
+async function syncSession() {
+    const params = lastMessageId === null ? {} : { after: lastMessageId };
+    const data = await fetchMessages(params);
+    if (data && data.messages.length > 0) {
+        lastMessageId = data.messages[data.messages.length - 1].id;
     }
+    await fetchSessions();
     displaySessions();
 }
 
@@ -83,7 +144,7 @@ async function sendMessage() {
     }
     const message = input.value.trim();
     if (!message) return;
-    if (!currentSessionTitle) {
+    if (currentSessionId === null) {
         alert("Please create a session first.");
         showCreateSessionModal();
         return;
@@ -117,18 +178,23 @@ async function sendMessage() {
     loadingIndicator.style.display = "flex";
 
     try {
-        const response = await fetch("/chat", {
+        const response = await fetch("/chat/stream", {
             method: "POST",
             headers: { "Content-Type": "application/json" },
-            body: JSON.stringify({ message, session_title: currentSessionTitle, model: selectedModel })
+            body: JSON.stringify({ message, session_id: currentSessionId, model: selectedModel })
         });
+        const contentType = response.headers.get("Content-Type") || "";
+        if (response.ok && contentType.startsWith("text/event-stream")) {
+            const streamed = await readChatStream(response, loadingIndicator);
+            if (streamed) {
+                await syncSession();
+            }
+            return;
+        }
+        // Rejections and validation errors come back as plain JSON
         const data = await response.json();
         if (response.ok && data.response) {
             addMessage("grok", data.response);
-            await loadHistory();
-            currentSessionIndex = historyData.findIndex(session => session.title === currentSessionTitle);
-            console.log("Updated currentSessionIndex after sending message:", currentSessionIndex);
-            displaySessions();
         } else {
             console.error("Error from server:", data.error || "Unknown error");
             addMessage("grok", "Error: " + (data.error || "Failed to get a response from the server."));
@@ -143,6 +209,57 @@ async function sendMessage() {
     }
 }
 
+// Reads server-sent events from /chat/stream and renders the reply as it arrives.
+// Returns true once the server reports the reply as saved.
+async function readChatStream(response, loadingIndicator) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let replyText = "";
+    let div = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let eventName = "message";
+            let dataLines = [];
+            rawEvent.split("\n").forEach(line => {
+                if (line.startsWith("event:")) eventName = line.slice(6).trim();
+                else if (line.startsWith("data:")) dataLines.push(line.slice(5).trim());
+            });
+            if (!dataLines.length) continue;
+            const data = JSON.parse(dataLines.join("\n"));
+            if (eventName === "delta") {
+                if (!div) {
+                    if (loadingIndicator) loadingIndicator.style.display = "none";
+                    div = addMessage("grok", "");
+                }
+                replyText += data.text;
+                renderMessage(div, replyText);
+            } else if (eventName === "done") {
+                if (!div) {
+                    div = addMessage("grok", "");
+                }
+                renderMessage(div, data.response);
+                return true;
+            } else if (eventName === "error") {
+                console.error("Error from server:", data.error);
+                addMessage("grok", "Error: " + (data.error || "Failed to get a response from the server."));
+                return false;
+            }
+        }
+    }
+    // The connection closed before the server finished the reply
+    console.error("Stream ended without a done event");
+    addMessage("grok", "Error: The response was interrupted. Please try again.");
+    return false;
+}
+
 function showCreateSessionModal() {
     let modal = document.getElementById("createSessionModal");
     if (!modal) {
@@ -179,6 +296,7 @@ async function createSession() {
         return;
     }
 
+    let sessionId;
     try {
         const response = await fetch("/create_session", {
             method: "POST",
@@ -191,15 +309,14 @@ async function createSession() {
             alert("Error creating session: " + (data.error || "Failed to create session."));
             return;
         }
-        console.log("Session created successfully:", title);
+        sessionId = data.session_id;
+        console.log("Session created successfully:", title, sessionId);
     } catch (error) {
         console.error("Fetch error in createSession:", error);
         alert("Error creating session: Failed to connect to the server.");
         return;
     }
 
-    currentSessionTitle = title;
-    currentSessionIndex = -1;
     const modal = document.getElementById("createSessionModal");
     if (modal) {
         modal.style.display = "none";
@@ -208,13 +325,8 @@ async function createSession() {
     if (chatBox) {
         chatBox.innerHTML = "";
     }
-    await loadHistory();
-    currentSessionIndex = historyData.findIndex(session => session.title === currentSessionTitle);
-    if (currentSessionIndex !== -1) {
-        loadSession(currentSessionIndex);
-    } else {
-        console.error("Newly created session not found in historyData");
-    }
+    await fetchSessions();
+    await loadSession(sessionId);
 }
 
 async function startNewSession() {
@@ -225,8 +337,9 @@ async function clearHistory() {
     try {
         await fetch("/clear_history", { method: "POST" });
         historyData = [];
-        currentSessionIndex = -1;
-        currentSessionTitle = null;
+        currentSessionId = null;
+        nextCursor = null;
+        lastMessageId = null;
         let chatBox = document.getElementById("chatBox");
         if (chatBox) {
             chatBox.innerHTML = "";
@@ -249,17 +362,23 @@ async function logout() {
     }
 }
 
-function addMessage(sender, text) {
-    let chatBox = document.getElementById("chatBox");
-    if (!chatBox) {
-        console.error("Chat box element not found in addMessage, creating fallback");
-        chatBox = document.createElement("div");
-        chatBox.id = "chatBox";
-        chatBox.className = "chat-area";
-        document.body.appendChild(chatBox);
-    }
+function createMessageElement(sender, text) {
     const div = document.createElement("div");
     div.className = `message ${sender}`;
+    renderMessage(div, text);
+    return div;
+}
+
+function addMessage(sender, text) {
+    const chatBox = getChatBox();
+    const div = createMessageElement(sender, text);
+    chatBox.appendChild(div);
+    chatBox.scrollTop = chatBox.scrollHeight;
+    return div;
+}
+
+function renderMessage(div, text) {
+    div.innerHTML = "";
 
     // Check if the text contains numbered steps (e.g., "1. Step Name\n   Description")
     const lines = text.split("\n");
@@ -306,8 +425,10 @@ function addMessage(sender, text) {
         div.appendChild(ol);
     }
 
-    chatBox.appendChild(div);
-    chatBox.scrollTop = chatBox.scrollHeight;
+    const chatBox = div.parentElement;
+    if (chatBox) {
+        chatBox.scrollTop = chatBox.scrollHeight;
+    }
 }
 
 function autoResize(textarea) {
@@ -333,6 +454,11 @@ document.addEventListener("DOMContentLoaded", () => {
     console.log("Message input on DOMContentLoaded:", messageInput);
 
     loadHistory();
+    if (chatBox) {
+        chatBox.addEventListener("scroll", () => {
+            if (chatBox.scrollTop < 50) loadOlderMessages();
+        });
+    }
     if (messageInput) {
         autoResize(messageInput);
     }
@@ -0,0 +1,451 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter
+
+from sqlite_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    title TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (username, title)
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id INTEGER NOT NULL REFERENCES sessions(id) ON DELETE CASCADE,
+    user TEXT NOT NULL,
+    user_en TEXT,
+    grok TEXT NOT NULL,
+    grok_en TEXT,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_sessions_username ON sessions (username, id);
+CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, id);
+"""
+
+# Largest SQLite INTEGER, used as an open upper bound for ID ranges
+MAX_ROW_ID = 2 ** 63 - 1
+
+# Legacy history.json entries without a session wrapper end up here
+LEGACY_SESSION_TITLE = "Untitled Session"
+
+# Write-behind queue for chat messages; a full queue blocks the request for up to
+# HISTORY_QUEUE_TIMEOUT, after which the message is written inline instead
+HISTORY_QUEUE_SIZE = int(os.getenv("HISTORY_QUEUE_SIZE", 1000))
+HISTORY_QUEUE_TIMEOUT = float(os.getenv("HISTORY_QUEUE_TIMEOUT", 2))
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", 100))
+# Upper bound on how long a read waits for the same user's queued messages
+HISTORY_FLUSH_TIMEOUT = float(os.getenv("HISTORY_FLUSH_TIMEOUT", 5))
+# How long the writer waits for more messages before committing a batch
+HISTORY_COMMIT_DELAY = float(os.getenv("HISTORY_COMMIT_DELAY", 0.002))
+
+HISTORY_PRAGMAS = ("PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL", "PRAGMA foreign_keys=ON")
+
+INSERT_MESSAGE = (
+    "INSERT INTO messages (session_id, user, user_en, grok, grok_en, created_at) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+
+
+class SessionExistsError(Exception):
+    pass
+
+
+class HistoryStore:
+    """Chat history backed by SQLite in WAL mode.
+
+    Every user's sessions and messages are rows indexed by username, so appending
+    a message is a single INSERT and reading history only touches the caller's rows.
+    Sessions are addressed by ID. Resolving one is a primary-key or (username, title)
+    index lookup, always against the database, so sessions deleted or renamed by
+    another worker are never served from a stale copy.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._pool = ConnectionPool(path, HISTORY_PRAGMAS, row_factory=sqlite3.Row)
+        self._init_lock = threading.Lock()
+        self.writer = None
+        with self._init_lock:
+            conn = self._conn()
+            conn.executescript(SCHEMA)
+
+    def _conn(self):
+        return self._pool.connection()
+
+    def start_writer(self, **options):
+        """Queue appended messages for a background writer (see HistoryWriter)."""
+        self.writer = HistoryWriter(self, **options)
+        return self.writer
+
+    def _read_own_writes(self, username):
+        # Reads wait for the user's queued messages so a reply shows up in the next fetch.
+        # This only sees this process's queue, hence write-behind is for single-worker setups.
+        if self.writer is not None:
+            self.writer.wait_for(username)
+
+    def is_empty(self):
+        return self._conn().execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is None
+
+    def session_id_for(self, username, title):
+        row = self._conn().execute(
+            "SELECT id FROM sessions WHERE username = ? AND title = ?", (username, title)
+        ).fetchone()
+        return row["id"] if row else None
+
+    def owns_session(self, username, session_id):
+        row = self._conn().execute(
+            "SELECT 1 FROM sessions WHERE id = ? AND username = ?", (session_id, username)
+        ).fetchone()
+        return row is not None
+
+    def create_session(self, username, title):
+        try:
+            cur = self._conn().execute(
+                "INSERT INTO sessions (username, title, created_at) VALUES (?, ?, ?)",
+                (username, title, time.time()),
+            )
+        except sqlite3.IntegrityError:
+            raise SessionExistsError(title)
+        return cur.lastrowid
+
+    def get_or_create_session(self, username, title):
+        # Returns (session ID, created); sending to an unknown title creates it, as history.json did
+        session_id = self.session_id_for(username, title)
+        if session_id is not None:
+            return session_id, False
+        try:
+            return self.create_session(username, title), True
+        except SessionExistsError:
+            return self.session_id_for(username, title), False
+
+    def rename_session(self, username, session_id, title):
+        # Messages reference the session by ID, so a rename is a single-row update
+        try:
+            cur = self._conn().execute(
+                "UPDATE sessions SET title = ? WHERE id = ? AND username = ?", (title, session_id, username)
+            )
+        except sqlite3.IntegrityError:
+            raise SessionExistsError(title)
+        return cur.rowcount == 1
+
+    def append_message(self, username, session_id, message):
+        # Returns None if the session isn't the user's, or was deleted meanwhile
+        if not self.owns_session(username, session_id):
+            return None
+        try:
+            cur = self._conn().execute(INSERT_MESSAGE, message_row(session_id, message))
+        except sqlite3.IntegrityError:
+            return None
+        return cur.lastrowid
+
+    def queue_message(self, username, session_id, message):
+        # Returns False if the user doesn't own the session; the write may still be pending
+        if self.writer is None:
+            return self.append_message(username, session_id, message) is not None
+        if not self.owns_session(username, session_id):
+            return False
+        self.writer.submit(username, message_row(session_id, message))
+        return True
+
+    def get_history(self, username):
+        self._read_own_writes(username)
+        conn = self._conn()
+        sessions = conn.execute(
+            "SELECT id, title FROM sessions WHERE username = ? ORDER BY id", (username,)
+        ).fetchall()
+        rows = conn.execute(
+            "SELECT m.session_id, m.user, m.user_en, m.grok, m.grok_en FROM messages m "
+            "JOIN sessions s ON s.id = m.session_id WHERE s.username = ? ORDER BY m.id",
+            (username,),
+        ).fetchall()
+        by_session = {s["id"]: {"id": s["id"], "title": s["title"], "messages": []} for s in sessions}
+        for row in rows:
+            by_session[row["session_id"]]["messages"].append({
+                "user": row["user"],
+                "user_en": row["user_en"],
+                "grok": row["grok"],
+                "grok_en": row["grok_en"],
+            })
+        return list(by_session.values())
+
+    def list_sessions(self, username):
+        # Titles and counts only; message bodies are fetched per session
+        self._read_own_writes(username)
+        rows = self._conn().execute(
+            "SELECT s.id, s.title, COUNT(m.id) AS message_count, MAX(m.id) AS last_message_id "
+            "FROM sessions s LEFT JOIN messages m ON m.session_id = s.id "
+            "WHERE s.username = ? GROUP BY s.id ORDER BY s.id",
+            (username,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_messages(self, username, session_id, before=None, after=None, limit=50, include_english=False):
+        """One page of a session's messages, oldest first.
+
+        Without a cursor the newest `limit` messages are returned. `before` pages
+        backwards from a message ID, `after` returns only messages newer than it
+        (and older than `before`, if both are given).
+        Returns (messages, next_cursor); next_cursor is the ID to pass as `before`
+        for the previous page, or None when there is nothing older.
+        """
+        if not self.owns_session(username, session_id):
+            return None, None
+        self._read_own_writes(username)
+        columns = "id, user, grok, user_en, grok_en" if include_english else "id, user, grok"
+        conn = self._conn()
+        if after is not None:
+            # With both cursors this is the range strictly between them
+            rows = conn.execute(
+                f"SELECT {columns} FROM messages WHERE session_id = ? AND id > ? AND id < ? ORDER BY id LIMIT ?",
+                (session_id, after, before if before is not None else MAX_ROW_ID, limit),
+            ).fetchall()
+            return [dict(row) for row in rows], None
+        if before is not None:
+            rows = conn.execute(
+                f"SELECT {columns} FROM messages WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+                (session_id, before, limit + 1),
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                f"SELECT {columns} FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, limit + 1),
+            ).fetchall()
+        has_more = len(rows) > limit
+        messages = [dict(row) for row in reversed(rows[:limit])]
+        next_cursor = messages[0]["id"] if has_more and messages else None
+        return messages, next_cursor
+
+    def clear(self, username):
+        self._read_own_writes(username)
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT id FROM sessions WHERE username = ?)",
+                (username,),
+            )
+            conn.execute("DELETE FROM sessions WHERE username = ?", (username,))
+
+    def migrate_from_json(self, json_path):
+        """One-shot import of the old history.json layout. Returns (sessions, messages) imported.
+
+        Only an empty store is imported into, checked under the write lock, so when
+        several workers start at once exactly one of them runs the import.
+        """
+        try:
+            with open(json_path, "r") as f:
+                history = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            logger.error("Error loading %s for migration: %s", json_path, e)
+            return 0, 0
+
+        session_count = 0
+        message_count = 0
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM sessions LIMIT 1").fetchone() is not None:
+                logger.info("History store already populated, skipping import of %s", json_path)
+                return 0, 0
+            for username, entries in history.items():
+                sessions = []
+                legacy_messages = []
+                for entry in entries or []:
+                    if "messages" in entry or "title" in entry:
+                        sessions.append(entry)
+                    else:
+                        # Oldest layout: a flat list of {"user", "grok"} pairs
+                        legacy_messages.append(entry)
+                if legacy_messages:
+                    sessions.insert(0, {"title": LEGACY_SESSION_TITLE, "messages": legacy_messages})
+
+                for entry in sessions:
+                    title = entry.get("title") or LEGACY_SESSION_TITLE
+                    row = conn.execute(
+                        "SELECT id FROM sessions WHERE username = ? AND title = ?", (username, title)
+                    ).fetchone()
+                    if row:
+                        session_id = row["id"]
+                    else:
+                        session_id = conn.execute(
+                            "INSERT INTO sessions (username, title, created_at) VALUES (?, ?, ?)",
+                            (username, title, time.time()),
+                        ).lastrowid
+                        session_count += 1
+                    for msg in entry.get("messages", []):
+                        conn.execute(INSERT_MESSAGE, (session_id, msg.get("user", ""), msg.get("user_en"),
+                                                      msg.get("grok", ""), msg.get("grok_en"), time.time()))
+                        message_count += 1
+        logger.info("Migrated %d sessions and %d messages from %s", session_count, message_count, json_path)
+        return session_count, message_count
+
+
+def message_row(session_id, message):
+    return (session_id, message.get("user"), message.get("user_en"),
+            message.get("grok"), message.get("grok_en"), time.time())
+
+
+class HistoryWriter:
+    """Background writer that appends queued messages in group commits.
+
+    Requests return as soon as their message is queued. Each batch is one
+    transaction on a synchronous=FULL connection, so a burst of replies costs one
+    WAL fsync instead of one per message. Pending messages are counted per user so
+    reads can wait for just that user's writes, and the queue is drained on
+    interpreter exit.
+
+    Only reads in this process can wait for the queue. With several worker
+    processes another worker may serve the next read before the message is
+    committed, so the writer is meant for single-worker deployments.
+    """
+
+    _STOP = object()
+
+    def __init__(self, store, max_pending=HISTORY_QUEUE_SIZE, max_batch=HISTORY_BATCH_SIZE,
+                 commit_delay=HISTORY_COMMIT_DELAY):
+        self.store = store
+        self.max_batch = max_batch
+        self.commit_delay = commit_delay
+        self._queue = queue.Queue()
+        # Free queue slots; submitters wait for one outside _submit_lock
+        self._slots = threading.Semaphore(max_pending)
+        self._pending = Counter()  # username -> messages queued or being committed
+        self._cond = threading.Condition()
+        # Serializes submit() with close() so nothing is queued behind _STOP
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self.batches = 0
+        self.messages = 0
+        self.inline_writes = 0
+        self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def depth(self):
+        return self._queue.qsize()
+
+    def submit(self, username, row):
+        with self._cond:
+            self._pending[username] += 1
+        item = (username, row)
+        queued = False
+        if self._slots.acquire(timeout=HISTORY_QUEUE_TIMEOUT):
+            with self._submit_lock:
+                if not self._closed:
+                    self._queue.put_nowait(item)
+                    queued = True
+            if not queued:
+                self._slots.release()
+        else:
+            logger.warning("History queue full for %.1fs, writing inline", HISTORY_QUEUE_TIMEOUT)
+        if not queued:
+            # Never drop a message: past the backpressure timeout (or after shutdown) write it here
+            self.inline_writes += 1
+            self._commit([item])
+
+    def wait_for(self, username, timeout=HISTORY_FLUSH_TIMEOUT):
+        with self._cond:
+            if not self._cond.wait_for(lambda: not self._pending.get(username), timeout):
+                logger.warning("Timed out waiting for queued messages of user %s", username)
+
+    def flush(self, timeout=HISTORY_FLUSH_TIMEOUT):
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending, timeout)
+
+    def _commit(self, batch):
+        conn = self.store._conn()
+        rows = [row for _, row in batch]
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(INSERT_MESSAGE, rows)
+        except sqlite3.Error as e:
+            # One bad row (e.g. its session was deleted meanwhile) mustn't lose the rest
+            logger.warning("Batch commit of %d messages failed (%s), retrying one by one", len(rows), e)
+            for row in rows:
+                try:
+                    conn.execute(INSERT_MESSAGE, row)
+                except sqlite3.Error as row_error:
+                    logger.error("Dropping message for session %s: %s", row[0], row_error)
+        finally:
+            with self._cond:
+                self.batches += 1
+                self.messages += len(batch)
+                for username, _ in batch:
+                    self._pending[username] -= 1
+                    if self._pending[username] <= 0:
+                        del self._pending[username]
+                self._cond.notify_all()
+
+    def _run(self):
+        # Commits on this connection fsync the WAL, once per batch
+        self.store._conn().execute("PRAGMA synchronous=FULL")
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            self._slots.release()
+            batch = [item]
+            deadline = time.monotonic() + self.commit_delay
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is self._STOP:
+                    stopping = True
+                    break
+                self._slots.release()
+                batch.append(item)
+            try:
+                self._commit(batch)
+            except Exception:
+                logger.exception("History writer failed to commit %d messages", len(batch))
+        # Anything submitted before close() still gets written
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not self._STOP:
+                leftover.append(item)
+        if leftover:
+            self._commit(leftover)
+        # The connection goes back to the pool for request threads
+        self.store._conn().execute("PRAGMA synchronous=NORMAL")
+
+    def close(self, timeout=HISTORY_FLUSH_TIMEOUT * 2):
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put_nowait(self._STOP)
+        self._thread.join(timeout)
+        logger.info("History writer stopped after %d messages in %d batches", self.messages, self.batches)
+
+
+if __name__ == "__main__":
+    # Usage: python storage.py [history.json] [history.db]
+    logging.basicConfig(level=logging.INFO)
+    src = sys.argv[1] if len(sys.argv) > 1 else "history.json"
+    dst = sys.argv[2] if len(sys.argv) > 2 else os.getenv("HISTORY_DB", "history.db")
+    store = HistoryStore(dst)
+    if not store.is_empty():
+        print(f"{dst} already contains history, refusing to migrate twice")
+        sys.exit(1)
+    sessions, messages = store.migrate_from_json(src)
+    print(f"Migrated {sessions} sessions and {messages} messages from {src} into {dst}")
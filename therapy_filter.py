@@ -0,0 +1,75 @@
+import re
+
+# Source list for the therapy filter. Edit this list; the matcher below is rebuilt from it at import.
+THERAPY_KEYWORDS = [
+    "therapy", "therapist", "therapeutic", "counseling", "counselor", "psychotherapy",
+    "mental health", "mental illness", "mental wellness", "psychologist", "psychiatrist",
+    "psychiatric", "psychology", "wellbeing", "well-being", "emotional health", "emotional wellness",
+    "depression", "depressed", "depressing", "anxiety", "anxious", "stress", "stressed", "trauma", "ptsd",
+    "post-traumatic", "bipolar", "schizophrenia", "ocd", "obsessive-compulsive", "adhd", "attention deficit",
+    "borderline", "bpd", "eating disorder", "anorexia", "bulimia", "binge eating", "panic disorder",
+    "social anxiety", "generalized anxiety", "phobia", "insomnia", "sleep disorder", "mood disorder",
+    "personality disorder", "dissociation", "derealization", "depersonalization", "hypomania", "mania",
+    "psychosis", "delusion", "hallucination", "sad", "sadness", "anxious", "stressed", "overwhelmed",
+    "angry", "anger", "frustrated", "lonely", "loneliness", "isolated", "isolation", "guilt", "guilty",
+    "shame", "ashamed", "fear", "fearful", "scared", "worried", "not", "worry", "hopeless", "helpless", "despair",
+    "grief", "grieving", "mourning", "loss", "jealous", "jealousy", "envy", "irritable", "irritation",
+    "nervous", "tense", "restless", "empty", "numb", "feeling", "fine","hurt", "pain", "emotional pain", "heartbroken",
+    "betrayed", "trust issues", "cbt", "cognitive behavioral therapy", "dbt", "dialectical behavior therapy",
+    "emdr", "eye movement", "mindfulness", "meditation", "psychodynamic", "humanistic", "gestalt",
+    "family therapy", "group therapy", "art therapy", "music therapy", "play therapy", "exposure therapy",
+    "narrative therapy", "solution-focused", "acceptance and commitment", "act therapy", "behavioral therapy",
+    "interpersonal therapy", "ipt", "trauma-focused", "somatic", "body-based", "grounding",
+    "breathing exercises", "relaxation techniques", "coping", "self-care", "self-compassion", "self-love",
+    "self-acceptance", "resilience", "self-esteem", "confidence", "motivation", "self-worth", "self-image",
+    "body image", "journaling", "gratitude", "positive thinking", "affirmations", "visualization",
+    "stress management", "time management", "problem-solving", "emotional regulation", "self-soothing",
+    "distraction", "self-awareness", "self-reflection", "boundaries", "assertiveness", "communication skills",
+    "conflict resolution", "sleep", "sleep hygiene", "diet", "nutrition", "exercise", "physical activity",
+    "yoga", "fitness", "health", "healthy habits", "routine", "structure", "balance", "work-life balance",
+    "hydration", "caffeine", "alcohol", "substance use", "smoking", "screen time", "social media",
+    "digital detox", "relationship", "relationships", "family", "feelings", "family issues", "parenting", "marriage",
+    "divorce", "breakup", "separation", "friendship", "friends", "social support", "support system",
+    "community", "connection", "intimacy", "attachment", "codependency", "abandonment", "rejection",
+    "bullying", "harassment", "abuse", "emotional abuse", "physical abuse", "sexual abuse", "neglect",
+    "toxic relationship", "gaslighting", "manipulation", "trust", "betrayal", "infidelity", "cheating",
+    "loneliness in relationships", "addiction", "substance abuse", "alcoholism", "drug use", "recovery",
+    "sobriety", "relapse", "withdrawal", "detox", "rehab", "rehabilitation", "12-step", "aa", "na",
+    "gambling", "pornography", "internet addiction", "gaming addiction", "shopping addiction", "overeating",
+    "compulsion", "suicidal", "suicide", "self-harm", "cutting", "crisis", "emergency", "hotline", "helpline",
+    "panic attack", "breakdown", "meltdown", "overdose", "danger", "safety plan", "urgent", "immediate help",
+    "happiness", "joy", "peace", "calm", "relaxation", "contentment", "fulfillment", "purpose", "meaning",
+    "hope", "optimism", "positivity", "growth", "personal growth", "self-improvement", "self-development",
+    "healing", "closure", "forgiveness", "letting go", "acceptance", "inner peace", "balance", "harmony",
+    "spirituality", "faith", "beliefs", "values", "identity", "self-discovery", "authenticity", "burnout",
+    "work stress", "job stress", "career", "workplace", "productivity", "procrastination", "overwork",
+    "job loss", "unemployment", "not feeling well", "performance anxiety", "imposter syndrome", "perfectionism",
+    "life transition", "change", "adjustment", "midlife crisis", "quarter-life crisis", "aging", "retirement",
+    "pregnancy", "postpartum", "menopause", "chronic illness", "disability", "caregiving", "loss of loved one",
+    "moving", "relocation", "culture shock", "immigration", "acculturation", "identity crisis", "empathy",
+    "compassion", "validation", "support", "encouragement", "motivation", "inspiration", "mental clarity",
+    "focus", "concentration", "memory", "brain fog", "decision-making", "overthinking", "rumination",
+    "intrusive thoughts", "flashbacks", "nightmares", "triggers", "trauma response", "fight or flight",
+    "freeze response", "fawn response", "hypervigilance", "dissociative", "numbing",
+    "emotional intelligence", "eq", "self-regulation", "social skills", "interpersonal skills"
+]
+
+
+def compile_keywords(keywords):
+    # One alternation, longest keyword first so "mental health" wins over "health".
+    # Keywords only match as whole words, so "na" no longer hits inside "banana".
+    unique = sorted({k.lower() for k in keywords}, key=len, reverse=True)
+    alternation = "|".join(re.escape(k) for k in unique)
+    return re.compile(rf"(?<!\w)(?:{alternation})(?!\w)")
+
+
+THERAPY_KEYWORD_PATTERN = compile_keywords(THERAPY_KEYWORDS)
+
+
+def find_therapy_keywords(message, pattern=THERAPY_KEYWORD_PATTERN):
+    # Single linear pass; returns (keyword, start offset) for every hit
+    return [(m.group(0), m.start()) for m in pattern.finditer(message.lower())]
+
+
+def is_therapy_related(message, pattern=THERAPY_KEYWORD_PATTERN):
+    return pattern.search(message.lower()) is not None
@@ -0,0 +1,73 @@
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+
+from metrics import RATE_LIMIT_REJECTIONS, REQUEST_SECONDS, STAGE_SECONDS
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = "%(asctime)s %(levelname)s [%(request_id)s] %(message)s"
+
+
+class RequestIdFilter(logging.Filter):
+    # Stamps every record with the current request ID ("-" outside a request)
+    def filter(self, record):
+        record.request_id = g.get("request_id", "-") if has_request_context() else "-"
+        return True
+
+
+def current_request_id():
+    return g.get("request_id", "-") if has_request_context() else "-"
+
+
+def init_tracing(app):
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    handler.addFilter(RequestIdFilter())
+    app.logger.handlers = [handler]
+    app.logger.setLevel(LOG_LEVEL)
+    app.logger.propagate = False
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex[:16]
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        response.headers["X-Request-ID"] = g.get("request_id", "-")
+        duration = time.perf_counter() - g.get("request_start", time.perf_counter())
+        endpoint = request.endpoint or "unknown"
+        REQUEST_SECONDS.observe(duration, endpoint=endpoint, status=response.status_code)
+        if response.status_code == 429:
+            RATE_LIMIT_REJECTIONS.inc(endpoint=endpoint)
+        if app.logger.isEnabledFor(logging.INFO):
+            # content_length reads the header; computing it would drain a streamed body here
+            app.logger.info(
+                "request method=%s path=%s status=%s duration_ms=%.1f bytes_in=%s bytes_out=%s",
+                request.method, request.path, response.status_code, duration * 1000,
+                request.content_length or 0, response.content_length or 0,
+            )
+        return response
+
+
+@contextmanager
+def stage(logger, name, **fields):
+    """Time a pipeline stage and log it as one structured line.
+
+    Extra fields (payload sizes, languages, ...) can be added to the yielded dict
+    inside the block. The duration always feeds the stage histogram; the log line
+    is only formatted when INFO is enabled.
+    """
+    start = time.perf_counter()
+    try:
+        yield fields
+    finally:
+        duration = time.perf_counter() - start
+        STAGE_SECONDS.observe(duration, stage=name)
+        if logger.isEnabledFor(logging.INFO):
+            extra = " ".join(f"{key}={value}" for key, value in fields.items())
+            logger.info("stage=%s duration_ms=%.1f %s", name, duration * 1000, extra)
@@ -0,0 +1,118 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from sqlite_pool import ConnectionPool
+
+logger = logging.getLogger(__name__)
+
+# Entries older than this are treated as misses and purged at start-up
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", 7 * 24 * 3600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS translations (
+    source TEXT NOT NULL,
+    target TEXT NOT NULL,
+    text TEXT NOT NULL,
+    translated TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (source, target, text)
+);
+"""
+
+
+class TranslationCache:
+    """Translation cache keyed on (source, target, text).
+
+    A bounded in-memory LRU sits in front of a SQLite table so translations
+    survive restarts. Disk hits are promoted into the LRU, and entries expire
+    after `ttl` seconds. Callers decide what is cacheable; user messages never are.
+    """
+
+    def __init__(self, path, max_entries=10000, ttl=TRANSLATION_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (translated, created_at)
+        self._lock = threading.Lock()
+        self._pool = ConnectionPool(path, ("PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL"))
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        conn.execute("DELETE FROM translations WHERE created_at < ?", (time.time() - ttl,))
+
+    def _conn(self):
+        return self._pool.connection()
+
+    def _remember(self, key, translated, created_at):
+        # Caller holds the lock
+        self._entries[key] = (translated, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, source, target, text):
+        key = (source, target, text)
+        oldest = time.time() - self.ttl
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] >= oldest:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+        row = self._conn().execute(
+            "SELECT translated, created_at FROM translations "
+            "WHERE source = ? AND target = ? AND text = ? AND created_at >= ?",
+            (*key, oldest),
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._remember(key, row[0], row[1])
+        return row[0]
+
+    def put(self, source, target, text, translated):
+        key = (source, target, text)
+        now = time.time()
+        with self._lock:
+            self._remember(key, translated, now)
+        try:
+            self._conn().execute(
+                "INSERT OR REPLACE INTO translations (source, target, text, translated, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (source, target, text, translated, now),
+            )
+        except sqlite3.Error as e:
+            # The in-memory copy is still usable, persisting is best effort
+            logger.warning("Could not persist translation: %s", e)
+
+    def translate(self, source, target, text, translate_fn):
+        # Returns the cached translation or calls translate_fn(text) and caches its result
+        translated = self.get(source, target, text)
+        if translated is None:
+            translated = translate_fn(text)
+            if translated is not None:
+                self.put(source, target, text, translated)
+        return translated
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+            }